@@ -1,5 +1,16 @@
 import argparse
 
+# type= for counts: argparse reports a negative one as a usage error
+def count_type(value):
+    try:
+        count = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a number: {value}")
+    if count < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, not {value}")
+    return count
+
+
 argparser = argparse.ArgumentParser(description="The Git Learning Parser")
 argsubparser = argparser.add_subparsers(dest="command", title="Commands")
 argsubparser.required = True
@@ -12,6 +23,13 @@ branch_parser = argsubparser.add_parser("branch", help="Look at your current bra
 
 switch_parser = argsubparser.add_parser("switch", help="Switch branches")
 switch_parser.add_argument("branch", help="Name of the branch to shift to")
+switch_parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=None,
+    help="Number of files written in parallel",
+)
 
 create_branch_parser = argsubparser.add_parser(
     "create-branch", help="Create new branches"
@@ -26,7 +44,18 @@ catfile_parser = argsubparser.add_parser("cat-file")
 catfile_parser.add_argument(
     "--obj-type", metavar="type", dest="type", choices=["blob", "commit", "tag", "tree"]
 )
-catfile_parser.add_argument("sha")
+catfile_parser.add_argument("sha", nargs="?")
+catfile_parser.add_argument(
+    "--batch",
+    action="store_true",
+    help="Read object names from stdin, print each object's sha, type, size and content",
+)
+catfile_parser.add_argument(
+    "--batch-check",
+    dest="batch_check",
+    action="store_true",
+    help="Read object names from stdin, print each object's sha, type and size",
+)
 
 
 # Given a file it'll make it binary string in a proper format, compresses it stores in the sha path of that binary format (given -w option). It prints the sha hash object.
@@ -37,16 +66,53 @@ hashobject_parser.add_argument(
     action="store_true",
     help="Actually write the object into database",
 )
-hashobject_parser.add_argument("path")
+hashobject_parser.add_argument("path", nargs="?")
+hashobject_parser.add_argument(
+    "--stdin-paths",
+    dest="stdin_paths",
+    action="store_true",
+    help="Read file paths from stdin, one per line, and print the sha of each",
+)
 
 # Takes the sha of a commit object and prints its contents
-log_parser = argsubparser.add_parser("log", help="Display history of given commit")
-log_parser.add_argument("commit", default="HEAD")
+log_parser = argsubparser.add_parser(
+    "log",
+    help="Display history of given commit",
+    usage="%(prog)s [options] [commit] [-- <path>...]",
+)
+log_parser.add_argument("commit", nargs="?", default="HEAD")
+log_parser.add_argument(
+    "-n",
+    "--max-count",
+    dest="max_count",
+    type=count_type,
+    default=None,
+    help="Show at most this many commits",
+)
+log_parser.add_argument(
+    "--since", default=None, help="Only commits newer than this date (or unix time)"
+)
+log_parser.add_argument(
+    "--until", default=None, help="Only commits older than this date (or unix time)"
+)
+log_parser.add_argument(
+    "--first-parent",
+    dest="first_parent",
+    action="store_true",
+    help="Follow only the first parent of merge commits",
+)
 
 
 checkout_parser = argsubparser.add_parser("checkout")
 checkout_parser.add_argument("commit", help="The commit or tree to checkout.")
 checkout_parser.add_argument("path", help="The Empty directory to check on")
+checkout_parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=None,
+    help="Number of files written in parallel",
+)
 
 showref_parser = argsubparser.add_parser("show-ref", help="List references")
 
@@ -78,6 +144,13 @@ rev_parser.add_argument("name")
 
 # Untracked files: (comparision of index file with HEAD (previous commit and staging area))
 status_parser = argsubparser.add_parser("status", help="Print the status of the game")
+status_parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=None,
+    help="Number of threads used to stat and rehash files",
+)
 
 
 rm_parser = argsubparser.add_parser("rm", help="Remove paths from the staging area")
@@ -87,6 +160,13 @@ rm_parser.add_argument("path", nargs="+", help="Paths to remove")
 
 add_parser = argsubparser.add_parser("add", help="Adding files to staging area")
 add_parser.add_argument("path", nargs="+", help="Paths going to staging area")
+add_parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=None,
+    help="Number of files hashed in parallel (defaults to the number of CPUs)",
+)
 
 
 commit_parser = argsubparser.add_parser("commit", help="Finally commit it goddammit")
@@ -98,3 +178,52 @@ commit_parser.add_argument(
 )
 
 commits_parser = argsubparser.add_parser("all-commits", help="Display all the commits")
+
+repack_parser = argsubparser.add_parser("repack", help="Pack loose objects into a packfile")
+
+difftree_parser = argsubparser.add_parser("diff-tree", help="Compare the content of two trees")
+difftree_parser.add_argument("old", help="The old commit or tree")
+difftree_parser.add_argument("new", help="The new commit or tree")
+
+gc_parser = argsubparser.add_parser(
+    "gc", help="Pack reachable objects and prune unreachable ones"
+)
+gc_parser.add_argument(
+    "--grace",
+    type=int,
+    default=None,
+    help="Keep unreachable objects younger than this many seconds (default: two weeks)",
+)
+
+packrefs_parser = argsubparser.add_parser(
+    "pack-refs", help="Move branches and tags into the packed-refs file"
+)
+
+mergebase_parser = argsubparser.add_parser(
+    "merge-base", help="Find the best common ancestor of two commits"
+)
+mergebase_parser.add_argument("one", help="The first commit")
+mergebase_parser.add_argument("two", help="The second commit")
+mergebase_parser.add_argument(
+    "--all",
+    action="store_true",
+    help="Print every best common ancestor, not just one",
+)
+
+commitgraph_parser = argsubparser.add_parser(
+    "commit-graph", help="Write the commit-graph file used to speed up history walks"
+)
+
+
+# log takes paths after "--" (git's "log [commit] -- <path>..."), which argparse can't tell
+# apart from the optional commit, so they are split off before parsing. Everything after
+# "--" is a path, never a commit.
+def parse_args(argvs):
+    paths = list()
+    if argvs[:1] == ["log"] and "--" in argvs:
+        i = argvs.index("--")
+        argvs, paths = argvs[:i], argvs[i + 1 :]
+    args = argparser.parse_args(argvs)
+    if args.command == "log":
+        args.paths = paths
+    return args
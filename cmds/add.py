@@ -1,11 +1,18 @@
-from cmds.rm import rm
 import os
+from concurrent.futures import ThreadPoolExecutor
 from stage.indexfile import GITIndexEntry
 from stage.readwrite import index_read, index_write
+from helpers.repo.helpers import repo_file, repo_jobs, repo_find
 from helpers.objects.helpers import object_hash
 from termcolor import cprint
 
-def add(repo, paths, delete=True, skip_missing=False):
+# Hashes and writes one file and builds its index entry. Runs on the worker threads.
+def add_entry(repo, abspath, relpath):
+    with open(abspath, "rb") as f:
+        sha = object_hash(f, b"blob", repo)
+        return GITIndexEntry.from_stat(relpath, sha, os.stat(abspath))
+
+def add(repo, paths, delete=True, skip_missing=False, jobs=None):
     if paths[0] == ".":
         all_files = list()
         gitdir_prefix = repo.gitdir + os.path.sep
@@ -19,7 +26,6 @@ def add(repo, paths, delete=True, skip_missing=False):
                 
         paths = all_files
 
-    rm(repo, paths, delete=False, skip_missing=True)
     worktree = repo.worktree + os.sep
 
     cleanpaths = set()
@@ -33,22 +39,37 @@ def add(repo, paths, delete=True, skip_missing=False):
         cleanpaths.add((p, relpath))
 
     index = index_read(repo)
+    index_file = repo_file(repo, "index")
+    index_mtime = os.stat(index_file).st_mtime_ns if os.path.exists(index_file) else 0
 
+    # Files whose stat data still matches their entry keep their sha without being read.
+    # An entry written in the same tick as the index ("racy") can't be trusted that way:
+    # the file may have changed again right after it was hashed, so it gets rehashed.
+    todo = list()
+    for (abspath, relpath) in sorted(cleanpaths, key=lambda p: p[1]):
+        entry = index.get(relpath)
+        if entry is not None:
+            racy = entry.mtime[0] * 10**9 + entry.mtime[1] >= index_mtime
+            if not racy and entry.stat_matches(os.stat(abspath)):
+                continue
+        todo.append((abspath, relpath))
 
+    if not todo:
+        return
 
-    for (abspath, relpath) in cleanpaths:
-        with open(abspath, "rb") as f:
-            sha = object_hash(f, b"blob", repo)
-            stat = os.stat(abspath)
-            ctime_s = int(stat.st_ctime)
-            ctime_ns = stat.st_ctime_ns % 10**9
-            mtime_s = int(stat.st_mtime)
-            mtime_ns = stat.st_mtime_ns % 10**9
+    jobs = repo_jobs(jobs)
 
-            entry = GITIndexEntry(ctime=(ctime_s, ctime_ns), mtime=(mtime_s, mtime_ns), dev=stat.st_dev, ino=stat.st_ino,
-                                  mode_type=0b1000, mode_perms=0o644, uid=stat.st_uid, gid=stat.st_gid,
-                                  fsize=stat.st_size, sha=sha, flag_assume_valid=False,
-                                  flag_stage=False, name=relpath)
-            index.entries.append(entry)
+    # the workers only produce entries; the index itself is updated here, in path order
+    if jobs > 1 and len(todo) > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            entries = list(pool.map(lambda p: add_entry(repo, *p), todo))
+    else:
+        entries = [add_entry(repo, *p) for p in todo]
 
+    index.update(entries)
     index_write(repo, index)
+
+
+def cmd_add(args):
+    repo = repo_find()
+    add(repo, args.path, jobs=args.jobs)
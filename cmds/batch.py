@@ -0,0 +1,60 @@
+import sys
+from common.objects import GITObject
+from helpers.objects.helpers import object_resolve, object_hash
+
+# Long running modes for tools that would otherwise start zyra once per object: requests come
+# in one per line on stdin, answers go out as soon as each one is ready, and the repository,
+# its packs and caches are set up only once. Nothing goes stale over a session though: every
+# name is resolved against refs checked against the disk (see refs_load), and an object that
+# isn't found makes the pack list reload, so refs moved and objects written by other processes
+# are answered as they are now.
+
+
+# For every object name read: "{sha} {type} {size}\n", followed by the content and a "\n"
+# when contents is set. Like git, "{name} missing\n" when the name resolves to nothing (or to an
+# object the store doesn't have), "{name} ambiguous\n" when it resolves to more than one object.
+def cat_file_batch(repo, contents=True, stdin=None, stdout=None):
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout.buffer
+
+    for line in stdin:
+        name = line.strip()
+        if not name:
+            continue
+        shas = [sha for sha in object_resolve(repo, name) or [] if sha]
+        if len(shas) != 1:
+            stdout.write(f"{name} {'ambiguous' if shas else 'missing'}\n".encode())
+            stdout.flush()
+            continue
+        sha = shas[0]
+        try:
+            if contents:
+                obj_type, size, chunks = GITObject.object_stream(repo, sha)
+            else:
+                obj_type, size = GITObject.object_info(repo, sha)
+        except Exception:
+            stdout.write(f"{name} missing\n".encode())
+            stdout.flush()
+            continue
+
+        stdout.write(f"{sha} {obj_type.decode()} {size}\n".encode())
+        if contents:
+            for chunk in chunks:
+                stdout.write(chunk)
+            stdout.write(b"\n")
+        stdout.flush()
+
+
+# For every path read, the sha of the file as a blob (written into the repo when given)
+def hash_object_stdin_paths(repo=None, stdin=None, stdout=None):
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+
+    for line in stdin:
+        path = line.rstrip("\n")
+        if not path:
+            continue
+        with open(path, "rb") as f:
+            sha = object_hash(f, b"blob", repo, verbose=False)
+        stdout.write(sha + "\n")
+        stdout.flush()
@@ -0,0 +1,38 @@
+import os
+from helpers.refs.helpers import ref_update
+from helpers.repo.helpers import repo_file, repo_dir, repo_find, repo_store_branch
+
+
+def cmd_branch(args):
+    from termcolor import cprint
+
+    repo = repo_find()
+    head_file = repo_file(repo, "HEAD")
+    print("branches:")
+    with open(head_file, "r") as f:
+        data = f.read()
+
+    if data.startswith("ref:"):
+        my_branch = data[16:-1]
+        cprint(f" * {my_branch.strip()}", "green")
+    else:
+        my_branch = data[:-1]
+        cprint(f" detached state: * {my_branch.strip()}", "green")
+
+    branches_path = repo_dir(repo, "branches")
+    for bs in os.listdir(branches_path):
+
+        if bs == my_branch.strip():
+            continue
+        print("   " + bs)
+
+
+def cmd_create_branch(args):
+    from termcolor import cprint
+
+    newbranch = args.branch
+    repo = repo_find()
+    ref_update(repo, "HEAD", f"ref: refs/heads/{newbranch}")
+    cprint(f"Created a new branch {newbranch}", "green")
+
+    repo_store_branch(newbranch)
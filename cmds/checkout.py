@@ -1,17 +1,209 @@
 from common.objects import GITObject
+from helpers.diff.helpers import diff_tree_tree
+from helpers.objects.helpers import object_hash, object_find
+from helpers.refs.helpers import ref_resolve, ref_update
+from helpers.repo.helpers import repo_file, repo_jobs, repo_find
+from stage.indexfile import GITIndexEntry
+from stage.readwrite import index_read, index_write
+import collections
 import os
+from concurrent.futures import ThreadPoolExecutor
 
-def tree_checkout(repo, tree, path):
+# Copies a blob into dest chunk by chunk, so big files never sit in memory whole
+def blob_checkout(repo, sha, dest):
+    _, _, chunks = GITObject.object_stream(repo, sha)
+    with open(dest, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+
+# Writes per worker that may wait in the pool's queue before the producer is held back
+CHECKOUT_BACKLOG = 4
+
+# Writes (sha, dest) blobs on a pool of threads: each worker inflates and writes its own
+# files. The directories have to exist already. jobs=None runs a thread per core (see repo_jobs).
+# items is consumed as the writes go: once CHECKOUT_BACKLOG writes per worker are pending, the
+# oldest one is waited for before the next item is taken, so a tree walk producing the items
+# overlaps with the writes and only a bounded number of futures is ever held.
+def blobs_checkout(repo, items, jobs=None):
+    jobs = repo_jobs(jobs)
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for sha, dest in items:
+            if len(pending) >= jobs * CHECKOUT_BACKLOG:
+                pending.popleft().result()
+            pending.append(pool.submit(blob_checkout, repo, sha, dest))
+        for future in pending:
+            future.result()
+
+# Walks the tree, creating its directories on the way, and produces the (sha, dest) blobs to write
+def tree_checkout_items(repo, tree, path):
     for item in tree.items:
-        obj = GITObject.object_read(repo, item.sha)
         dest = os.path.join(path, item.path)
 
-        if obj.obj_type == b'tree':
+        if item.mode.startswith(b'04'):
+            obj = GITObject.object_read(repo, item.sha)
             if os.path.isdir(dest):
                 pass
             else:
                 os.makedirs(dest)
-            tree_checkout(repo, obj, dest)
-        elif obj.obj_type == b'blob':
-            with open(dest, "wb") as f:
-                f.write(obj.blobdata)
+            yield from tree_checkout_items(repo, obj, dest)
+        else:
+            yield item.sha, dest
+
+def tree_checkout(repo, tree, path, jobs=None):
+    blobs_checkout(repo, tree_checkout_items(repo, tree, path), jobs)
+
+# Paths the switch would clobber: staged changes (the index no longer holds the old tree's
+# blob), tracked files with local changes, and untracked files sitting where the target tree
+# wants to put something. Stat data is trusted the same way add and status trust it.
+def switch_conflicts(repo, index, changes):
+    index_file = repo_file(repo, "index")
+    index_mtime = os.stat(index_file).st_mtime_ns if os.path.exists(index_file) else 0
+
+    conflicts = list()
+    for status, path, old_sha, new_sha in changes:
+        entry = index.get(path)
+        staged = entry.sha if entry else None
+        if staged != old_sha and staged != new_sha:
+            conflicts.append(path)
+            continue
+
+        full_path = os.path.join(repo.worktree, path)
+        if not os.path.lexists(full_path):
+            continue
+        if entry is None:
+            if status != "D":
+                conflicts.append(path)
+            continue
+        racy = entry.mtime[0] * 10**9 + entry.mtime[1] >= index_mtime
+        if not racy and entry.stat_matches(os.stat(full_path)):
+            continue
+        with open(full_path, "rb") as fd:
+            sha = object_hash(fd, b"blob", None)
+        if sha != entry.sha and sha != new_sha:
+            conflicts.append(path)
+    return conflicts
+
+# Moves the worktree and the index from tree old to tree new, touching only the paths that
+# differ between them. Returns the conflicting paths (and changes nothing) if local
+# changes are in the way.
+def tree_switch(repo, old, new, index, jobs=None):
+    changes = list(diff_tree_tree(repo, old, new))
+    conflicts = switch_conflicts(repo, index, changes)
+    if conflicts:
+        return conflicts
+
+    # deletions first: a directory in the old tree may be a file in the new one, and the other way round
+    emptied = set()
+    deleted = list()
+    for status, path, _, _ in changes:
+        if status == "D":
+            full_path = os.path.join(repo.worktree, path)
+            if os.path.lexists(full_path):
+                os.unlink(full_path)
+            deleted.append(path)
+            emptied.add(os.path.dirname(path))
+    index.remove_many(deleted)
+
+    # remove the directories that deletions left empty, deepest first
+    for path in sorted(emptied, key=len, reverse=True):
+        while path != "":
+            full_path = os.path.join(repo.worktree, path)
+            if not os.path.isdir(full_path) or os.listdir(full_path):
+                break
+            os.rmdir(full_path)
+            path = os.path.dirname(path)
+
+    writes = list()
+    for status, path, _, sha in changes:
+        if status != "D":
+            full_path = os.path.join(repo.worktree, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            writes.append((sha, full_path))
+    blobs_checkout(repo, writes, jobs)
+
+    # fresh stat data, so the next status doesn't rehash what we just wrote
+    entries = list()
+    for status, path, _, sha in changes:
+        if status != "D":
+            entries.append(GITIndexEntry.from_stat(path, sha, os.stat(os.path.join(repo.worktree, path))))
+    index.update(entries)
+
+    return []
+
+
+def cmd_checkout(args):
+    from termcolor import cprint
+
+    repo = repo_find()
+    sha = args.commit
+    path = args.path
+
+    if path == ".":
+        cprint(
+            "You cannot provide the current directory for checkout\nIf you want to go to an other branch use 'switch' command",
+            "red",
+        )
+        return
+    obj = GITObject.object_read(repo, object_find(repo, sha))
+    if obj.obj_type == b"commit":
+        obj = GITObject.object_read(repo, obj.kvlm[b"tree"].decode("ascii"))
+
+    if os.path.exists(path):
+        if not os.path.isdir(path):
+            raise Exception("The provided path is not a directory")
+        if os.listdir(path):
+            pass
+            # raise Exception("The given path already contains something")
+    else:
+        os.makedirs(path)
+
+    print(obj)
+    tree_checkout(repo, obj, os.path.realpath(path), jobs=args.jobs)
+
+
+def cmd_switch(args):
+    from termcolor import cprint
+
+    branch_name = args.branch
+    repo = repo_find()
+    path = "."
+
+    print(branch_name, path)
+
+    branch_exists = ref_resolve(repo, "refs/heads/" + branch_name.strip()) is not None
+
+    if not branch_exists:
+        for filename in os.listdir(repo_file(repo, "branches")):
+            if filename == branch_name.strip():
+                branch_exists = True
+                break
+
+        if branch_exists:
+            ref_update(repo, "HEAD", f"ref: refs/heads/{branch_name}")
+
+            return
+
+
+    if not branch_exists:
+        cprint("First create a branch using the 'create-branch' command", "red")
+        return
+
+    branch_name = branch_name.strip()
+
+    # only the paths that differ between the current HEAD and the branch are rewritten
+    current = object_find(repo, "HEAD", obj_type=b"tree")
+    target = object_find(repo, branch_name, obj_type=b"tree")
+    index = index_read(repo)
+
+    conflicts = tree_switch(repo, current, target, index, jobs=args.jobs)
+    if conflicts:
+        cprint("Your local changes to these files would be overwritten by switch:", "red")
+        for path in conflicts:
+            cprint(f"  {path}", "red")
+        cprint("Commit them (or remove them) before you switch branches", "red")
+        return
+
+    index_write(repo, index)
+
+    ref_update(repo, "HEAD", f"ref: refs/heads/{branch_name}")
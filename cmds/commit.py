@@ -1,4 +1,7 @@
-from helpers.repo.helpers import repo_file
+from helpers.repo.helpers import repo_file, repo_find
+from helpers.objects.helpers import object_find
+from helpers.refs.helpers import ref_update
+from stage.readwrite import index_read, index_write
 from common.objects import GITObject
 from common.commit.commit_obj import GITCommit
 from common.tree.tree_obj import GITTree
@@ -7,6 +10,7 @@ from stage.indexfile import GITIndexEntry
 
 import configparser
 import os
+from datetime import datetime
 
 def branch_get_active(repo):
     with open(repo_file(repo, "HEAD"), "r") as f:
@@ -37,11 +41,15 @@ def commit_create(repo, tree, parent, author, timestamp, message):
 
     return GITObject.object_write(commit, repo)
 
+# Builds (and writes) the tree objects for the index and returns the root tree sha.
+# Directories whose cache-tree entry is still valid are not rebuilt: their sha is reused
+# and nothing below them is looked at. Freshly written trees go back into the cache-tree.
 def tree_from_index(repo, index):
     contents = dict()
     contents[""] = list()
+    counts = dict()
 
-    for entry in index.entries:
+    for entry in index:
         dirname = os.path.dirname(entry.name)
         key = dirname 
         while key != "":
@@ -50,20 +58,52 @@ def tree_from_index(repo, index):
             key = os.path.dirname(key)
         contents[dirname].append(entry)      
 
+        key = dirname
+        while True:
+            counts[key] = counts.get(key, 0) + 1
+            if key == "":
+                break
+            key = os.path.dirname(key)
+
+    valid = set()
+    for path in contents:
+        cached = index.cache_tree.get(path)
+        if cached and cached[0] == counts.get(path, 0):
+            valid.add(path)
+
+    if "" in valid:
+        return index.cache_tree[""][1]
+
+    def covered(path):
+        while path != "":
+            path = os.path.dirname(path)
+            if path in valid:
+                return True
+        return False
+
     sorted_paths = sorted(contents.keys(), key=len, reverse=True)  
     sha = None
 
     for path in sorted_paths:
-        tree = GITTree()
-        for entry in contents[path]:
-            if isinstance(entry, GITIndexEntry):
-                leaf_mode = f"{entry.mode_type:02o}{entry.mode_perms:04o}".encode("ascii")
-                leaf = GITTreeLeaf(mode = leaf_mode, path=os.path.basename(entry.name), sha=entry.sha)
-            else: 
-                leaf = GITTreeLeaf(mode = b"040000", path=entry[0], sha=entry[1])
-            tree.items.append(leaf)
-        sha = GITObject.object_write(tree, repo)
+        if covered(path):
+            continue
 
+        if path in valid:
+            sha = index.cache_tree[path][1]
+        else:
+            tree = GITTree()
+            for entry in contents[path]:
+                if isinstance(entry, GITIndexEntry):
+                    leaf_mode = f"{entry.mode_type:02o}{entry.mode_perms:04o}".encode("ascii")
+                    leaf = GITTreeLeaf(mode = leaf_mode, path=os.path.basename(entry.name), sha=entry.sha)
+                else: 
+                    leaf = GITTreeLeaf(mode = b"040000", path=entry[0], sha=entry[1])
+                tree.items.append(leaf)
+            sha = GITObject.object_write(tree, repo)
+            index.cache_tree[path] = (counts.get(path, 0), sha)
+
+        if path == "":
+            break
         parent = os.path.dirname(path)
         base = os.path.basename(path) 
         contents[parent].append((base, sha))
@@ -85,4 +125,26 @@ def gitconfig_read():
 
     config = configparser.ConfigParser()
     config.read(configfiles)
-    return config
\ No newline at end of file
+    return config
+
+
+def cmd_commit(args):
+    repo = repo_find()
+    index = index_read(repo)
+    tree = tree_from_index(repo, index)
+    # keeps the cache-tree filled in by tree_from_index for the next commit
+    index_write(repo, index)
+    commit = commit_create(
+        repo,
+        tree,
+        object_find(repo, "HEAD"),
+        gitconfig_user_get(gitconfig_read()),
+        datetime.now(),
+        args.message,
+    )
+
+    active_branch = branch_get_active(repo)
+    if active_branch:
+        ref_update(repo, "refs/heads/" + active_branch, commit)
+    else:
+        ref_update(repo, "HEAD", commit)
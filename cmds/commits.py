@@ -1,9 +1,43 @@
-from helpers.repo.helpers import repo_file, repo_dir, repo_find
-import os
+from common.objects import GITObject
+from common.pack.pack_obj import pack_list
+from helpers.commits.helpers import commit_parents
+from helpers.objects.helpers import object_loose_list
+from helpers.refs.helpers import ref_resolve
+from helpers.repo.helpers import repo_file, repo_find
+
 
 def cmd_commits(args):
     repo = repo_find()
-    my_dir = repo_dir(repo, "objects")
-    for root, dirs, files in os.walk(my_dir):
-        for filename in files:
-            print(os.path.join(root, filename))
+    my_shas = object_loose_list(repo)
+    for pack in pack_list(repo):
+        my_shas.extend(pack.shas())
+
+    # only the commits get inflated past their header
+    for p in sorted(set(my_shas)):
+        obj_type, _ = GITObject.object_info(repo, p)
+        if obj_type == b"commit":
+            obj = GITObject.object_read(repo, p)
+            print(f"{p}: {obj.kvlm[None][:-1].decode()}")
+
+
+def cmd_bcommits(args):
+    from termcolor import cprint
+
+    repo = repo_find()
+    with open(repo_file(repo, "HEAD"), "r") as f:
+        branch = f.read()[16:-1]
+
+    sha = ref_resolve(repo, "refs/heads/" + branch)
+    if not sha:
+        cprint("Your current branch does not have any commits")
+        return
+
+    # the first parent chain comes from the commit-graph; objects are only read for messages
+    while sha:
+        obj = GITObject.object_read(repo, sha)
+        cprint(f"{obj.kvlm[None].decode()[:-1]}: {sha}", "yellow")
+        parents = commit_parents(repo, sha)
+        sha = parents[0] if parents else None
+
+    print()
+    cprint("Those were your commits in this branch", "cyan")
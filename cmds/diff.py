@@ -0,0 +1,11 @@
+from helpers.diff.helpers import diff_tree_tree
+from helpers.objects.helpers import object_find
+from helpers.repo.helpers import repo_find
+
+
+def cmd_diff_tree(args):
+    repo = repo_find()
+    old = object_find(repo, args.old, obj_type=b"tree")
+    new = object_find(repo, args.new, obj_type=b"tree")
+    for status, path, _, _ in diff_tree_tree(repo, old, new):
+        print(f"{status}\t{path}")
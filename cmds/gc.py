@@ -0,0 +1,153 @@
+import os
+import time
+import zlib
+from common.objects import GITObject
+from common.pack.pack_obj import pack_list, pack_write
+from helpers.objects.helpers import object_loose_list
+from helpers.commits.helpers import commit_info, commit_graph_update
+from helpers.refs.helpers import refs_load, ref_resolve
+from helpers.repo.helpers import repo_dir, repo_file, repo_find
+from stage.readwrite import index_read
+from termcolor import cprint
+
+# Unreachable objects younger than this are kept: another command may be about to use them
+GC_GRACE = 14 * 24 * 3600
+
+
+def gc_store_size(repo):
+    total = 0
+    for root, _, files in os.walk(repo_dir(repo, "objects")):
+        for f in files:
+            total += os.path.getsize(os.path.join(root, f))
+    return total
+
+
+# Every object reachable from the refs, HEAD and the index (its blobs and cache-tree trees)
+def gc_reachable(repo):
+    seen = set()
+    commits = list()
+    trees = list()
+
+    def peel(sha):
+        while sha not in seen:
+            obj_type, _ = GITObject.object_info(repo, sha)
+            seen.add(sha)
+            if obj_type == b"tag":
+                sha = GITObject.object_read(repo, sha).kvlm[b"object"].decode("ascii")
+            elif obj_type == b"commit":
+                commits.append(sha)
+            elif obj_type == b"tree":
+                trees.append(sha)
+            else:
+                return
+
+    refs = refs_load(repo)
+    for name in refs:
+        sha = ref_resolve(repo, name, refs)
+        if sha:
+            peel(sha)
+
+    index = index_read(repo)
+    for entry in index:
+        seen.add(entry.sha)
+    for _, sha in index.cache_tree.values():
+        peel(sha)
+
+    while commits:
+        tree, parents, _, _ = commit_info(repo, commits.pop())
+        if tree not in seen:
+            seen.add(tree)
+            trees.append(tree)
+        for p in parents:
+            if p not in seen:
+                seen.add(p)
+                commits.append(p)
+
+    while trees:
+        for leaf in GITObject.object_read(repo, trees.pop()).items:
+            # submodule entries ("160000") point into another repository
+            if leaf.sha in seen or leaf.mode.startswith(b"16"):
+                continue
+            seen.add(leaf.sha)
+            if leaf.mode.startswith(b"04"):
+                trees.append(leaf.sha)
+
+    return seen
+
+
+# Writes an object out as a loose file carrying the given mtime, so it ages from there
+def gc_loosen(repo, sha, obj_type, content, mtime):
+    path = repo_file(repo, "objects", sha[0:2], sha[2:], mkdir=True)
+    if os.path.exists(path):
+        return
+    with open(path, "wb") as f:
+        f.write(zlib.compress(obj_type + b" " + str(len(content)).encode() + b"\x00" + content))
+    os.utime(path, (mtime, mtime))
+
+
+# Packs everything reachable into one new pack, drops the old packs and removes loose
+# objects that are packed now or unreachable for longer than the grace period. Unreachable
+# objects of the old packs are kept loose (as old as their pack) until they age out too.
+def gc(repo, grace=GC_GRACE):
+    timings = list()
+    size_before = gc_store_size(repo)
+    cutoff = time.time() - grace
+
+    start = time.perf_counter()
+    reachable = gc_reachable(repo)
+    timings.append(("reachability", time.perf_counter() - start))
+
+    start = time.perf_counter()
+    old_packs = list(pack_list(repo, reload=True))
+    # only types and sizes up front: contents are read one by one while the pack is written
+    objects = [(sha, *GITObject.object_info(repo, sha)) for sha in sorted(reachable)]
+    path = pack_write(repo, objects, lambda sha: GITObject.object_read_raw(repo, sha)[1]) if objects else None
+
+    loosened = 0
+    for pack in old_packs:
+        if pack.path == path:
+            continue
+        mtime = os.path.getmtime(pack.path)
+        if mtime > cutoff:
+            for sha in pack.shas():
+                if sha not in reachable:
+                    gc_loosen(repo, sha, *pack.read(sha), mtime)
+                    loosened += 1
+        os.unlink(pack.path)
+        os.unlink(pack.idx_path)
+    pack_list(repo, reload=True)
+    timings.append(("packing", time.perf_counter() - start))
+
+    start = time.perf_counter()
+    objects_dir = repo_dir(repo, "objects")
+    pruned = 0
+    for sha in object_loose_list(repo):
+        loose = os.path.join(objects_dir, sha[0:2], sha[2:])
+        if sha in reachable:
+            os.unlink(loose)
+        elif os.path.getmtime(loose) < cutoff:
+            os.unlink(loose)
+            pruned += 1
+    for d in os.listdir(objects_dir):
+        fanout = os.path.join(objects_dir, d)
+        if len(d) == 2 and os.path.isdir(fanout) and not os.listdir(fanout):
+            os.rmdir(fanout)
+    timings.append(("pruning", time.perf_counter() - start))
+
+    start = time.perf_counter()
+    commit_graph_update(repo)
+    timings.append(("commit-graph", time.perf_counter() - start))
+
+    size_after = gc_store_size(repo)
+    if path:
+        cprint(f"Packed {len(objects)} reachable objects into {os.path.basename(path)}", "green")
+    cprint(f"Pruned {pruned} unreachable objects, {loosened} recent ones kept loose", "green")
+    cprint(f"Object store: {size_before} -> {size_after} bytes ({size_before - size_after} saved)", "green")
+    for phase, seconds in timings:
+        print(f"  {phase}: {seconds:.3f}s")
+
+
+def cmd_gc(args):
+    repo = repo_find()
+    # the parser leaves the default to GC_GRACE, so argparsing doesn't have to import this module
+    gc(repo, grace=GC_GRACE if args.grace is None else args.grace)
@@ -0,0 +1,30 @@
+from helpers.commits.helpers import commit_graph_update, merge_bases
+from helpers.objects.helpers import object_find
+from helpers.repo.helpers import repo_find
+
+
+def cmd_commit_graph(args):
+    from termcolor import cprint
+
+    repo = repo_find()
+    count = commit_graph_update(repo)
+    cprint(f"Wrote a commit-graph of {count} commits", "green")
+
+
+def cmd_merge_base(args):
+    from termcolor import cprint
+
+    repo = repo_find()
+    one = object_find(repo, args.one, obj_type=b"commit")
+    two = object_find(repo, args.two, obj_type=b"commit")
+    # object_find gives None for names of trees, blobs and tags of those
+    for name, sha in ((args.one, one), (args.two, two)):
+        if sha is None:
+            cprint(f"{name} is not a commit", "red")
+            return
+    bases = merge_bases(repo, one, two)
+    if not bases:
+        cprint("These commits have no common ancestor", "red")
+        return
+    for sha in bases if args.all else bases[:1]:
+        print(sha)
@@ -0,0 +1,9 @@
+from helpers.repo.helpers import repo_create, repo_store_branch
+
+
+def cmd_init(args):
+    from termcolor import cprint
+
+    if repo_create("."):
+        repo_store_branch("master")
+        cprint("zyra repository is succesfully initialised", "light_blue")
@@ -1,29 +1,130 @@
-
+import heapq
+import itertools
+import os
+from datetime import datetime
 from common.objects import GITObject
+from common.commit.commit_graph import commit_graph_load
+from common.commit.bloom import bloom_filter_maybe
+from helpers.commits.helpers import commit_info
+from helpers.diff.helpers import tree_path_sha
+from helpers.objects.helpers import object_find, object_abbrev
+from helpers.repo.helpers import repo_find
 
-def log_graphiz(repo, sha, seen):
-    if sha in seen:
-        return
-    seen.add(sha)
+# Walks history newest first: a heap of the commits seen but not shown yet, keyed by commit
+# time (ties go to whichever was reached first). It is a generator, so whoever stops asking for commits stops the walk as well.
+# since/until are unix times; first_parent follows only the first parent of merges; paths
+# keeps only the commits that change one of them (see log_touches).
+def log_walk(repo, shas, since=None, until=None, first_parent=False, paths=None):
+    heap = list()
+    seen = set()
+    order = itertools.count()
+
+    def push(sha):
+        if sha in seen:
+            return
+        seen.add(sha)
+        tree, parents, ctime, _ = commit_info(repo, sha)
+        heapq.heappush(heap, (-ctime, next(order), sha, tree, parents))
+
+    for sha in shas:
+        push(sha)
+
+    while heap:
+        negtime, _, sha, tree, parents = heapq.heappop(heap)
+        ctime = -negtime
+        # everything left in the heap is older still
+        if since is not None and ctime < since:
+            return
+        # with first_parent a merge is also only compared against its first parent
+        if first_parent:
+            parents = parents[:1]
+        if until is None or ctime <= until:
+            if not paths or log_touches(repo, sha, tree, parents, paths):
+                yield sha, ctime
+
+        for p in parents:
+            push(p)
+
+# Whether the commit changes any of the paths (files or directories, "" for the whole tree)
+# compared to the given parents. A merge only counts when it differs from every parent. The
+# Bloom filter in the commit-graph rules most commits out before any tree is read; the trees
+# have the final say on the rest (filters can be wrong the other way). Filters hold no entry
+# for the root, so they can't rule anything out when the whole tree is asked for.
+def log_touches(repo, sha, tree, parents, paths):
+    graph = commit_graph_load(repo)
+    i = graph.position(sha) if graph and "" not in paths else None
+    bloom = graph.bloom_at(i) if i is not None else None
+    if bloom is not None and not any(bloom_filter_maybe(bloom, path) for path in paths):
+        return False
 
+    ours = [tree_path_sha(repo, tree, path) for path in paths]
+    if not parents:
+        return any(ours)
+    for parent in parents:
+        parent_tree = commit_info(repo, parent)[0]
+        if ours == [tree_path_sha(repo, parent_tree, path) for path in paths]:
+            return False
+    return True
+
+def log_message(repo, sha):
     commitObj = GITObject.object_read(repo, sha)
     message = commitObj.kvlm[None].decode("utf8").strip()
     message = message.replace("\\", "\\\\")
     message = message.replace("\"", "\\\"")
 
-    if "\n" in message: 
+    if "\n" in message:
         message = message[:message.index("\n")]
+    return message
 
-    print(f"id: {sha[0:7]} | message: {message}")
+# Paths given on the command line, relative to the current directory, to the "/" separated
+# paths of the worktree that trees and filters use. "" stands for the whole worktree.
+def log_paths(repo, paths):
+    worktree = os.path.realpath(repo.worktree)
+    resolved = list()
+    for path in paths:
+        rel = os.path.relpath(os.path.realpath(path), worktree)
+        if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+            raise Exception(f"{path} is outside the worktree")
+        resolved.append("" if rel == os.curdir else rel.replace(os.sep, "/"))
+    return resolved
 
-    if not b'parent' in commitObj.kvlm:
-        return
+# "1700000000", "2024-05-01" or "2024-05-01 13:30" to a unix time
+def log_parse_date(value):
+    if value.isdigit():
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def cmd_log(args):
+    from termcolor import cprint
 
-    parents = commitObj.kvlm[b'parent']
+    repo = repo_find()
 
-    if type(parents) != list:
-        parents = [parents]
+    dates = dict()
+    for option, value in (("since", args.since), ("until", args.until)):
+        try:
+            dates[option] = log_parse_date(value) if value else None
+        except ValueError:
+            cprint(f"--{option}: {value} is not a date (use 2024-05-01, 2024-05-01 13:30 or a unix time)", "red")
+            return
+    try:
+        paths = log_paths(repo, args.paths)
+    except Exception as e:
+        cprint(str(e), "red")
+        return
+
+    # object_find raises for names that resolve to nothing (or to more than one object)
+    try:
+        sha = object_find(repo, args.commit, obj_type=b"commit")
+    except Exception:
+        sha = None
+    if sha is None:
+        cprint("You are supposed to provide the sha of a commit object only", "red")
+        return
 
-    for p in parents:
-        p = p.decode("ascii")
-        log_graphiz(repo, p, seen)
+    print("Here are your diagraphiz logs")
+    commits = log_walk(repo, [sha], since=dates["since"], until=dates["until"],
+                       first_parent=args.first_parent, paths=paths)
+    for sha, _ in itertools.islice(commits, args.max_count):
+        print(f"id: {object_abbrev(repo, sha)} | message: {log_message(repo, sha)}")
+    print("Logs ended here")
@@ -0,0 +1,47 @@
+import sys
+from common.objects import GITObject
+from helpers.objects.helpers import object_find, object_hash
+from helpers.repo.helpers import repo_find
+from cmds.batch import cat_file_batch, hash_object_stdin_paths
+
+
+def cmd_cat_file(args):
+    from termcolor import cprint
+
+    repo = repo_find()
+    if args.batch or args.batch_check:
+        cat_file_batch(repo, contents=args.batch)
+        return
+    if not args.sha:
+        cprint("Give the sha of an object (or use --batch / --batch-check)", "red")
+        return
+
+    t = args.type
+    obj_type = t.encode() if t else None
+    obj_type, _, chunks = GITObject.object_stream(repo, object_find(repo, args.sha, obj_type=obj_type))
+    print(obj_type)
+    sys.stdout.flush()
+    for chunk in chunks:
+        sys.stdout.buffer.write(chunk)
+
+
+def cmd_hash_obj(args):
+    from termcolor import cprint
+
+    write = args.write
+    path = args.path
+    if write:
+        repo = repo_find()
+    else:
+        repo = None
+
+    if args.stdin_paths:
+        hash_object_stdin_paths(repo)
+        return
+    if not path:
+        cprint("Give the path of a file (or use --stdin-paths)", "red")
+        return
+
+    with open(path, "rb") as f:
+        sha = object_hash(f, b"blob", repo)
+        print(sha)
@@ -0,0 +1,29 @@
+from helpers.objects.helpers import object_find
+from helpers.refs.helpers import ref_list, show_ref, refs_pack
+from helpers.repo.helpers import repo_find
+
+
+def cmd_show_ref(args):
+    repo = repo_find()
+    ref_dict = ref_list(repo)
+    print(ref_dict)
+    show_ref(repo, ref_dict, prefix="refs")
+
+
+def cmd_rev_parse(args):
+    if args.type:
+        obj_type = args.type.encode()
+    else:
+        obj_type = None
+
+    repo = repo_find()
+
+    print(object_find(repo, args.name, obj_type=obj_type, follow=True))
+
+
+def cmd_pack_refs(args):
+    from termcolor import cprint
+
+    repo = repo_find()
+    count = refs_pack(repo)
+    cprint(f"Packed {count} refs into packed-refs", "green")
@@ -0,0 +1,33 @@
+import os
+from common.objects import GITObject
+from common.pack.pack_obj import pack_write
+from helpers.objects.helpers import object_loose_list
+from helpers.repo.helpers import repo_dir, repo_find
+from termcolor import cprint
+
+
+# Moves every loose object into one new packfile and deletes the loose copies
+def repack(repo):
+    shas = object_loose_list(repo)
+    if not shas:
+        cprint("Nothing to pack, there are no loose objects", "yellow")
+        return None
+
+    objects = [(sha, *GITObject.object_info(repo, sha)) for sha in shas]
+    path = pack_write(repo, objects, lambda sha: GITObject.object_read_raw(repo, sha)[1])
+
+    objects_dir = repo_dir(repo, "objects")
+    for sha in shas:
+        os.unlink(os.path.join(objects_dir, sha[0:2], sha[2:]))
+    for sha in shas:
+        fanout = os.path.join(objects_dir, sha[0:2])
+        if os.path.isdir(fanout) and not os.listdir(fanout):
+            os.rmdir(fanout)
+
+    cprint(f"Packed {len(shas)} objects into {os.path.basename(path)}", "green")
+    return path
+
+
+def cmd_repack(args):
+    repo = repo_find()
+    repack(repo)
@@ -1,5 +1,6 @@
 import os
 from stage.readwrite import index_read, index_write
+from helpers.repo.helpers import repo_find
 
 def rm(repo, paths, delete=True, skip_missing=False):
     index = index_read(repo)
@@ -15,24 +16,32 @@ def rm(repo, paths, delete=True, skip_missing=False):
         else:
             raise Exception(f"Cannot remove paths outside of worktree: {paths}")
 
-    kept_entries = list()
     remove = list()
+    names = list()
 
-    for e in index.entries:
-        full_path = os.path.join(repo.worktree, e.name)
+    for abspath in abspaths:
+        name = os.path.relpath(abspath, repo.worktree)
+        if name in index:
+            remove.append(abspath)
+            names.append(name)
 
-        if full_path in abspaths:
-            remove.append(full_path)
-            abspaths.remove(full_path)
-        else:
-            kept_entries.append(e) 
-
-    if len(abspaths) > 0 and not skip_missing:
-        raise Exception(f"Cannot remove paths not in the index: {abspaths}")
+    if len(names) < len(abspaths) and not skip_missing:
+        missing = abspaths.difference(remove)
+        raise Exception(f"Cannot remove paths not in the index: {missing}")
 
     if delete:
         for path in remove:
             os.unlink(path)
 
-    index.entries = kept_entries
+    index.remove_many(names)
     index_write(repo, index)
+
+
+def cmd_rm(args):
+    repo = repo_find()
+    nd = args.nd
+    if nd:
+        delete = False
+    else:
+        delete = True
+    rm(repo, args.path, delete=delete)
@@ -1,7 +1,10 @@
 import os
-from helpers.repo.helpers import repo_file
+from concurrent.futures import ThreadPoolExecutor
+from helpers.repo.helpers import repo_file, repo_jobs, repo_find
 from helpers.objects.helpers import object_hash, object_find
-from helpers.objects.helpers import tree_to_dict
+from helpers.diff.helpers import diff_tree_index
+from stage.readwrite import index_read
+from stage.untracked import worktree_files
 from termcolor import cprint
 
 def cmd_status_branch(repo):
@@ -18,56 +21,78 @@ def cmd_status_branch(repo):
 def cmd_status_head_index(repo, index):
     # staging area is index file
     cprint("Changes staged for commit:", "blue")
-    head = tree_to_dict(repo, "HEAD")
-    for entry in index.entries:
-        if entry.name in head:
-            if head[entry.name] != entry.sha:
-                print("modified: ", entry.name)
-            del head[entry.name]
-        else:
-            print("added: ", entry.name)
-
-    for entry in head.keys():
-        print("deleted: ", entry)
+    head = object_find(repo, "HEAD", obj_type=b"tree")
+    labels = {"A": "added: ", "M": "modified: ", "D": "deleted: "}
+    for status, path, _, _ in diff_tree_index(repo, head, index):
+        print(labels[status], path)
 
     print()
 
-def cmd_status_index_worktree(repo, index):
+# How many index entries one stat task handles, so the pool isn't drowned in tiny tasks
+STATUS_STAT_BATCH = 256
+
+def status_stat_batch(paths):
+    stats = list()
+    for path in paths:
+        try:
+            stats.append(os.stat(path))
+        except OSError:
+            # gone, or a file on the way became a directory or the other way round
+            stats.append(None)
+    return stats
+
+def status_rehash(path):
+    with open(path, "rb") as fd:
+        return object_hash(fd, b"blob", None)
+
+# Stats every entry on one thread pool, rehashes the ones whose stat data moved on another,
+# then reports in index order. jobs=None runs a thread per core (see repo_jobs).
+def cmd_status_index_worktree(repo, index, jobs=None):
     cprint("Changes not staged for commit:", "blue")
 
-    gitdir_prefix = repo.gitdir + os.path.sep
-
-    all_files = list()
-
-    for root, _, files in os.walk(repo.worktree, True):
-        if root == repo.gitdir or root.startswith(gitdir_prefix):
-            continue
-        for f in files:
-            full_path = os.path.join(root, f)
-            rel_path = os.path.relpath(full_path, repo.worktree)
-            all_files.append(rel_path)
-
-    for entry in index.entries:
-        full_path = os.path.join(repo.worktree, entry.name)
-        if not os.path.exists(full_path):
-            print("  deleted: ", entry.name)
-        else:
-            stat = os.stat(full_path)
-
-            ctime_ns = entry.ctime[0] * 10**9 + entry.ctime[1]
-            mtime_ns = entry.mtime[0] * 10**9 + entry.mtime[1]
-            if (stat.st_ctime_ns != ctime_ns) or (stat.st_mtime_ns != mtime_ns):
-                with open(full_path, "rb") as fd:
-                    new_sha = object_hash(fd, b"blob", None)
-                    same = entry.sha == new_sha
-                    if not same:
-                        print(" modified:", entry.name)
-
-        if entry.name in all_files:
-            all_files.remove(entry.name)
+    # dict as an ordered set: walk order is kept and removing a tracked path is O(1)
+    all_files = dict.fromkeys(worktree_files(repo))
+
+    entries = list(index)
+    paths = [os.path.join(repo.worktree, e.name) for e in entries]
+    batches = [paths[i:i + STATUS_STAT_BATCH] for i in range(0, len(paths), STATUS_STAT_BATCH)]
+
+    index_file = repo_file(repo, "index")
+    index_mtime = os.stat(index_file).st_mtime_ns if os.path.exists(index_file) else 0
+
+    jobs = repo_jobs(jobs)
+    with ThreadPoolExecutor(max_workers=jobs) as stat_pool, ThreadPoolExecutor(max_workers=jobs) as hash_pool:
+        stats = [st for batch in stat_pool.map(status_stat_batch, batches) for st in batch]
+
+        # same rule as add: matching stat data is trusted unless the entry is racy
+        suspects = dict()
+        for i, (entry, stat) in enumerate(zip(entries, stats)):
+            if stat is None:
+                continue
+            racy = entry.mtime[0] * 10**9 + entry.mtime[1] >= index_mtime
+            if racy or not entry.stat_matches(stat):
+                suspects[i] = hash_pool.submit(status_rehash, paths[i])
+
+        for i, entry in enumerate(entries):
+            if stats[i] is None:
+                print("  deleted: ", entry.name)
+            elif i in suspects:
+                if entry.sha != suspects[i].result():
+                    print(" modified:", entry.name)
+
+            all_files.pop(entry.name, None)
 
     print()
     cprint("Untracked files:", "blue")
 
     for f in all_files:
         print(" ", f)
+
+
+def cmd_status(args):
+    repo = repo_find()
+    index = index_read(repo)
+
+    cmd_status_branch(repo)
+    cmd_status_head_index(repo, index)
+    cmd_status_index_worktree(repo, index, jobs=args.jobs)
@@ -1,8 +1,8 @@
 from helpers.objects.helpers import object_find
 from common.tag.tag_obj import GITTag
 from common.objects import GITObject
-from helpers.refs.helpers import ref_create
-from common.objects import GITObject
+from helpers.refs.helpers import ref_create, ref_list, show_ref
+from helpers.repo.helpers import repo_find
 
 
 def tag_create(repo, name, ref, create_tag_object=False):
@@ -23,3 +23,15 @@ def tag_create(repo, name, ref, create_tag_object=False):
         ref_create(repo, "tags/" + name, tag_sha)
     else:
         ref_create(repo, "tags/" + name, sha)
+
+
+def cmd_tag(args):
+    repo = repo_find()
+
+    if args.name:
+        tag_create(
+            repo, args.name, args.object, create_tag_object=args.create_tag_object
+        )
+    else:
+        ref_dict = ref_list(repo)
+        show_ref(repo, ref_dict, prefix="refs")
@@ -0,0 +1,59 @@
+import collections
+
+# Default budget for decoded objects kept in memory (sum of their content sizes)
+OBJECT_CACHE_SIZE = 64 * 1024 * 1024
+# Rough per-entry cost on top of the content so thousands of tiny objects still count
+OBJECT_CACHE_OVERHEAD = 128
+
+
+# Keeps recently read objects around so the same commit or tree is not inflated and
+# parsed again during one command. Bounded by the total size of what it holds; the
+# least recently used objects are dropped first. The objects handed out are shared,
+# so callers must not modify them.
+class GITObjectCache(object):
+    def __init__(self, max_size=OBJECT_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, sha):
+        return sha in self.entries
+
+    def get(self, sha):
+        entry = self.entries.get(sha)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(sha)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, sha, obj, size):
+        size += OBJECT_CACHE_OVERHEAD
+        # one huge blob should not flush everything else out
+        if size > self.max_size // 4:
+            return
+
+        if sha in self.entries:
+            self.size -= self.entries.pop(sha)[1]
+        self.entries[sha] = (obj, size)
+        self.size += size
+
+        while self.size > self.max_size:
+            _, (_, old_size) = self.entries.popitem(last=False)
+            self.size -= old_size
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "objects": len(self.entries), "size": self.size}
+
+
+object_cache = GITObjectCache()
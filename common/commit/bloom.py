@@ -0,0 +1,100 @@
+import struct
+
+# Changed-path Bloom filters, stored in the commit-graph next to each commit the same way git
+# stores them (BIDX/BDAT chunks, hash version 1). A commit's filter holds every path that
+# differs from its first parent, plus all the directories above those paths. Asking it about
+# a path answers "definitely not changed" or "maybe changed", so most commits of a path
+# limited log are ruled out without reading a single tree.
+BLOOM_HASH_VERSION = 1
+BLOOM_NUM_HASHES = 7
+BLOOM_BITS_PER_ENTRY = 10
+# Commits changing more paths than this get a filter that says "maybe" to everything
+BLOOM_MAX_CHANGED_PATHS = 512
+BLOOM_SEED_0 = 0x293ae76f
+BLOOM_SEED_1 = 0x7e646e2c
+BLOOM_HEADER = struct.Struct(">III")
+
+U32 = 0xFFFFFFFF
+
+
+def _rotl(x, r):
+    return ((x << r) | (x >> (32 - r))) & U32
+
+# git's version 1 filters hash through a signed char, so bytes >= 0x80 are sign extended
+def _byte(b):
+    return b | 0xFFFFFF00 if b & 0x80 else b
+
+def murmur3(seed, data):
+    c1 = 0xcc9e2d51
+    c2 = 0x1b873593
+    length = len(data)
+    h = seed
+    nblocks = length // 4
+
+    for i in range(nblocks):
+        k = (_byte(data[4 * i]) | (_byte(data[4 * i + 1]) << 8)
+             | (_byte(data[4 * i + 2]) << 16) | (_byte(data[4 * i + 3]) << 24)) & U32
+        k = (k * c1) & U32
+        k = _rotl(k, 15)
+        k = (k * c2) & U32
+        h ^= k
+        h = (_rotl(h, 13) * 5 + 0xe6546b64) & U32
+
+    tail = data[4 * nblocks:]
+    k = 0
+    if len(tail) >= 3:
+        k ^= (_byte(tail[2]) << 16) & U32
+    if len(tail) >= 2:
+        k ^= (_byte(tail[1]) << 8) & U32
+    if len(tail) >= 1:
+        k ^= _byte(tail[0])
+        k = (k * c1) & U32
+        k = _rotl(k, 15)
+        k = (k * c2) & U32
+        h ^= k
+
+    h ^= length
+    h ^= h >> 16
+    h = (h * 0x85ebca6b) & U32
+    h ^= h >> 13
+    h = (h * 0xc2b2ae35) & U32
+    h ^= h >> 16
+    return h
+
+def bloom_key(path):
+    data = path.encode("utf8")
+    h0 = murmur3(BLOOM_SEED_0, data)
+    h1 = murmur3(BLOOM_SEED_1, data)
+    return [(h0 + i * h1) & U32 for i in range(BLOOM_NUM_HASHES)]
+
+
+# Filter bytes for the changed file paths of a commit
+def bloom_filter_build(paths):
+    if len(paths) > BLOOM_MAX_CHANGED_PATHS:
+        return b"\xff"
+
+    keys = set()
+    for path in paths:
+        while path:
+            keys.add(path)
+            path = path.rpartition("/")[0]
+
+    size = max((len(keys) * BLOOM_BITS_PER_ENTRY + 7) // 8, 1)
+    data = bytearray(size)
+    bits = size * 8
+    for key in keys:
+        for h in bloom_key(key):
+            pos = h % bits
+            data[pos // 8] |= 1 << (pos & 7)
+    return bytes(data)
+
+# False means the path (a file or a directory) is definitely not changed by the commit
+def bloom_filter_maybe(data, path):
+    bits = len(data) * 8
+    if not bits:
+        return True
+    for h in bloom_key(path):
+        pos = h % bits
+        if not data[pos // 8] & (1 << (pos & 7)):
+            return False
+    return True
@@ -0,0 +1,248 @@
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+from helpers.repo.helpers import repo_file
+from common.commit.bloom import (
+    BLOOM_HEADER,
+    BLOOM_HASH_VERSION,
+    BLOOM_NUM_HASHES,
+    BLOOM_BITS_PER_ENTRY,
+)
+
+# The commit-graph (.git/objects/info/commit-graph), in git's format, so a history walk
+# doesn't have to inflate and parse every commit to find its parents.
+#
+# Header: b"CGPH" + version + hash version + number of chunks + number of base graphs,
+# then a table of (chunk id, offset) pairs ending with a zero id that marks where the last
+# chunk stops, the chunks themselves and a sha1 of everything before it.
+#   OIDF: 256 entry fanout table over the first sha byte (same as a pack index)
+#   OIDL: the sorted raw commit shas
+#   CDAT: per commit: root tree sha, first and second parent positions, and 8 bytes holding
+#         the generation (top 30 bits) and the commit time (low 34 bits)
+#   EDGE: parents past the first of octopus merges, the last one flagged with the top bit
+#   BIDX: where each commit's changed-path Bloom filter ends in BDAT (see common/commit/bloom.py)
+#   BDAT: hash version, number of hashes and bits per entry, then the filters back to back
+# A commit's generation is one more than the largest generation of its parents (roots are 1),
+# so an ancestor always has a smaller generation than its descendants.
+GRAPH_HEADER = struct.Struct(">4sBBBB")
+GRAPH_CHUNK = struct.Struct(">4sQ")
+GRAPH_DATA = struct.Struct(">20sIIQ")
+GRAPH_VERSION = 1
+GRAPH_HASH_SHA1 = 1
+
+GRAPH_PARENT_NONE = 0x70000000
+GRAPH_EXTRA_EDGES = 0x80000000
+GRAPH_LAST_EDGE = 0x80000000
+# Commits that aren't in the graph are treated as newer than everything that is
+GENERATION_INFINITY = 0xFFFFFFFF
+GENERATION_MAX = (1 << 30) - 1
+COMMIT_TIME_MASK = (1 << 34) - 1
+
+
+# Lets bisect look at the sorted sha table of the mmap without copying it out
+class _OidTable(object):
+    def __init__(self, data, start, count):
+        self.data = data
+        self.start = start
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        pos = self.start + 20 * i
+        return self.data[pos : pos + 20]
+
+
+class GITCommitGraph(object):
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        signature, version, hash_version, nchunks, _ = GRAPH_HEADER.unpack_from(self.data, 0)
+        if signature != b"CGPH":
+            raise Exception(f"Not a commit-graph: {path}")
+        if version != GRAPH_VERSION or hash_version != GRAPH_HASH_SHA1:
+            raise Exception(f"Unsupported commit-graph version {version}")
+
+        self.chunks = dict()
+        pos = GRAPH_HEADER.size
+        for _ in range(nchunks):
+            chunk_id, offset = GRAPH_CHUNK.unpack_from(self.data, pos)
+            self.chunks[chunk_id] = offset
+            pos += GRAPH_CHUNK.size
+        for chunk_id in (b"OIDF", b"OIDL", b"CDAT"):
+            if chunk_id not in self.chunks:
+                raise Exception(f"commit-graph is missing its {chunk_id.decode()} chunk")
+
+        self.fanout = struct.unpack_from(">256I", self.data, self.chunks[b"OIDF"])
+        self.count = self.fanout[255]
+        self.table = _OidTable(self.data, self.chunks[b"OIDL"], self.count)
+        self.cdat = self.chunks[b"CDAT"]
+        self.edge = self.chunks.get(b"EDGE")
+
+        # filters written with other settings can't be queried, so they're ignored
+        self.bidx = self.chunks.get(b"BIDX")
+        self.bdat = self.chunks.get(b"BDAT")
+        if self.bidx is not None and self.bdat is not None:
+            settings = BLOOM_HEADER.unpack_from(self.data, self.bdat)
+            if settings != (BLOOM_HASH_VERSION, BLOOM_NUM_HASHES, BLOOM_BITS_PER_ENTRY):
+                self.bidx = self.bdat = None
+        else:
+            self.bidx = self.bdat = None
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, sha):
+        return self.position(sha) is not None
+
+    def position(self, sha):
+        if len(sha) != 40:
+            return None
+        try:
+            raw = bytes.fromhex(sha)
+        except ValueError:
+            return None
+        first = raw[0]
+        lo = self.fanout[first - 1] if first else 0
+        hi = self.fanout[first]
+        i = bisect.bisect_left(self.table, raw, lo, hi)
+        if i < hi and self.table[i] == raw:
+            return i
+        return None
+
+    def sha_at(self, i):
+        return self.table[i].hex()
+
+    # (tree, [parent positions], commit time, generation) of the commit at position i
+    def data_at(self, i):
+        tree, p1, p2, packed = GRAPH_DATA.unpack_from(self.data, self.cdat + GRAPH_DATA.size * i)
+        parents = list()
+        if p1 != GRAPH_PARENT_NONE:
+            parents.append(p1)
+        if p2 & GRAPH_EXTRA_EDGES:
+            pos = self.edge + 4 * (p2 & ~GRAPH_EXTRA_EDGES)
+            while True:
+                edge = struct.unpack_from(">I", self.data, pos)[0]
+                parents.append(edge & ~GRAPH_LAST_EDGE)
+                if edge & GRAPH_LAST_EDGE:
+                    break
+                pos += 4
+        elif p2 != GRAPH_PARENT_NONE:
+            parents.append(p2)
+        return tree.hex(), parents, packed & COMMIT_TIME_MASK, packed >> 34
+
+    def parents_at(self, i):
+        return self.data_at(i)[1]
+
+    def generation_at(self, i):
+        return self.data_at(i)[3]
+
+    # The changed-path filter of the commit at position i, None when the graph has none
+    def bloom_at(self, i):
+        if self.bidx is None:
+            return None
+        end = struct.unpack_from(">I", self.data, self.bidx + 4 * i)[0]
+        start = struct.unpack_from(">I", self.data, self.bidx + 4 * (i - 1))[0] if i else 0
+        pos = self.bdat + BLOOM_HEADER.size
+        return self.data[pos + start : pos + end]
+
+    def shas(self):
+        for i in range(self.count):
+            yield self.sha_at(i)
+
+
+# One parsed graph (or None) per repository; reset by commit_graph_write
+graph_cache = dict()
+
+def commit_graph_load(repo):
+    if repo.gitdir not in graph_cache:
+        path = repo_file(repo, "objects", "info", "commit-graph")
+        graph_cache[repo.gitdir] = GITCommitGraph(path) if path and os.path.isfile(path) else None
+    return graph_cache[repo.gitdir]
+
+
+# commits: {sha: (tree, [parent shas], commit time)}, closed under parents (every parent
+# is in there too). Generations are worked out here. blooms, when given, has the changed-path
+# filter of every commit.
+def commit_graph_write(repo, commits, blooms=None):
+    shas = sorted(commits)
+    positions = {sha: i for i, sha in enumerate(shas)}
+
+    # parents first, without recursing: a commit is done once all of its parents are
+    generations = dict()
+    for sha in shas:
+        stack = [sha]
+        while stack:
+            top = stack[-1]
+            if top in generations:
+                stack.pop()
+                continue
+            pending = [p for p in commits[top][1] if p not in generations]
+            if pending:
+                stack.extend(pending)
+            else:
+                parents = commits[top][1]
+                gen = 1 + max((generations[p] for p in parents), default=0)
+                generations[top] = min(gen, GENERATION_MAX)
+                stack.pop()
+
+    fanout = [0] * 256
+    for sha in shas:
+        fanout[int(sha[0:2], 16)] += 1
+    total = 0
+    for i in range(256):
+        total += fanout[i]
+        fanout[i] = total
+
+    oidf = struct.pack(">256I", *fanout)
+    oidl = b"".join(bytes.fromhex(sha) for sha in shas)
+    cdat = bytearray()
+    edge = list()
+    for sha in shas:
+        tree, parents, ctime = commits[sha]
+        ps = [positions[p] for p in parents]
+        p1 = ps[0] if ps else GRAPH_PARENT_NONE
+        if len(ps) > 2:
+            p2 = GRAPH_EXTRA_EDGES | len(edge)
+            edge.extend(ps[1:-1])
+            edge.append(ps[-1] | GRAPH_LAST_EDGE)
+        else:
+            p2 = ps[1] if len(ps) == 2 else GRAPH_PARENT_NONE
+        packed = (generations[sha] << 34) | (ctime & COMMIT_TIME_MASK)
+        cdat += GRAPH_DATA.pack(bytes.fromhex(tree), p1, p2, packed)
+
+    chunks = [(b"OIDF", oidf), (b"OIDL", oidl), (b"CDAT", bytes(cdat))]
+    if edge:
+        chunks.append((b"EDGE", struct.pack(f">{len(edge)}I", *edge)))
+    if blooms is not None:
+        bidx = bytearray()
+        bdat = bytearray(BLOOM_HEADER.pack(BLOOM_HASH_VERSION, BLOOM_NUM_HASHES, BLOOM_BITS_PER_ENTRY))
+        for sha in shas:
+            bdat += blooms[sha]
+            bidx += struct.pack(">I", len(bdat) - BLOOM_HEADER.size)
+        chunks.append((b"BIDX", bytes(bidx)))
+        chunks.append((b"BDAT", bytes(bdat)))
+
+    out = bytearray(GRAPH_HEADER.pack(b"CGPH", GRAPH_VERSION, GRAPH_HASH_SHA1, len(chunks), 0))
+    offset = len(out) + GRAPH_CHUNK.size * (len(chunks) + 1)
+    for chunk_id, data in chunks:
+        out += GRAPH_CHUNK.pack(chunk_id, offset)
+        offset += len(data)
+    out += GRAPH_CHUNK.pack(b"\x00\x00\x00\x00", offset)
+    for _, data in chunks:
+        out += data
+    out += hashlib.sha1(out).digest()
+
+    path = repo_file(repo, "objects", "info", "commit-graph", mkdir=True)
+    tmp_path = path + ".lock"
+    with open(tmp_path, "wb") as f:
+        f.write(out)
+    os.replace(tmp_path, path)
+
+    graph_cache.pop(repo.gitdir, None)
+    return path
@@ -1,7 +1,15 @@
 import hashlib
 import os
 import zlib
-from helpers.repo.helpers import repo_file
+from helpers.repo.helpers import repo_file, repo_dir
+from common.pack.pack_obj import pack_find, pack_list
+from common.pack.pack_helper import inflate_iter
+from common.cache import object_cache
+
+# How much of a file is read, hashed and compressed at a time on the streaming paths
+STREAM_CHUNK = 1024 * 1024
+# Enough compressed input (and output) to get to the end of an object header
+INFO_CHUNK = 64
 
 # An object is stored in this manner: 
 # b'{typeof object}{size} \x00{content}' (obj type: {blob, commit, tag, tree})
@@ -48,37 +56,185 @@ class GITObject(object):
         
         return sha
 
+    #   Same as object_write, but the content comes from a file object of a known size and is
+    #   hashed and compressed chunk by chunk into a temp file, which is renamed into place once
+    #   the sha is known. Memory use stays the same whatever the size of the file.
+    @staticmethod
+    def object_write_stream(fd, size, obj_type=b'blob', repo=None, verbose=True):
+        sha1 = hashlib.sha1()
+        header = obj_type + b' ' + str(size).encode() + b'\x00'
+        sha1.update(header)
+
+        tmp = None
+        if repo:
+            import tempfile
+
+            compressor = zlib.compressobj()
+            handle, tmp_path = tempfile.mkstemp(prefix="tmp_obj_", dir=repo_dir(repo, "objects"))
+            tmp = os.fdopen(handle, "wb")
+            tmp.write(compressor.compress(header))
+
+        try:
+            remaining = size
+            while remaining > 0:
+                chunk = fd.read(min(STREAM_CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                sha1.update(chunk)
+                if tmp:
+                    tmp.write(compressor.compress(chunk))
+
+            if remaining != 0 or fd.read(1):
+                raise Exception("File changed size while it was being hashed")
+
+            if tmp:
+                tmp.write(compressor.flush())
+                tmp.close()
+        except:
+            if tmp:
+                tmp.close()
+                os.unlink(tmp_path)
+            raise
+
+        sha = sha1.hexdigest()
+        if not repo:
+            return sha
 
-    # takes the sha and returns the class according to the type of object. 
+        path = repo_file(repo, "objects", sha[0:2], sha[2:], mkdir=True)
+
+        if verbose:
+            print(path)
+
+        if os.path.exists(path):
+            os.unlink(tmp_path)
+        else:
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+
+        return sha
+
+
+    # takes the sha and returns (obj_type, content). Packs are tried first (an in-memory index lookup),
+    # then the loose file.
     @staticmethod
-    def object_read(repo, sha):
+    def object_read_raw(repo, sha):
+        pack = pack_find(repo, sha)
+        if pack:
+            return pack.read(sha)
+
         path = repo_file(repo, "objects", sha[0:2], sha[2:])
 
-        if not os.path.isfile(path):
-            raise Exception("No object exists here")
-        
-        with open(path, "rb") as f:
-            decomp_str = zlib.decompress(f.read())
+        if path and os.path.isfile(path):
+            with open(path, "rb") as f:
+                decomp_str = zlib.decompress(f.read())
             # b'blob{size} \x00{content}' -> format of storage. 
             x = decomp_str.find(b' ')
 
             obj_type = decomp_str[0:x]
             y = decomp_str.find(b'\x00', x)
 
-            content = decomp_str[y+1:]
-
-            from common.blob.blob_obj import GITBlob
-            from common.tag.tag_obj import GITTag
-            from common.tree.tree_obj import GITTree
-            from common.commit.commit_obj import GITCommit
-            match obj_type:
-                case b'commit': c=GITCommit
-                case b'tree'  : c=GITTree
-                case b'tag'   : c=GITTag
-                case b'blob'  : c=GITBlob
-                case _:
-                    raise Exception("I dont know what object this is")
-            
-            return c(decomp_str[y+1:])
-        
+            return obj_type, decomp_str[y+1:]
 
+        # someone else may have written a pack since we last looked
+        pack_list(repo, reload=True)
+        pack = pack_find(repo, sha)
+        if not pack:
+            raise Exception("No object exists here")
+
+        return pack.read(sha)
+
+    # takes the sha and returns (obj_type, size) while only inflating the object's header
+    @staticmethod
+    def object_info(repo, sha):
+        pack = pack_find(repo, sha)
+        if pack:
+            return pack.info(sha)
+
+        path = repo_file(repo, "objects", sha[0:2], sha[2:])
+
+        if not (path and os.path.isfile(path)):
+            pack_list(repo, reload=True)
+            pack = pack_find(repo, sha)
+            if not pack:
+                raise Exception("No object exists here")
+            return pack.info(sha)
+
+        # b'blob{size} \x00{content}' -> only as much is inflated as the header needs
+        d = zlib.decompressobj()
+        head = b''
+        with open(path, "rb") as f:
+            while b'\x00' not in head:
+                data = f.read(INFO_CHUNK)
+                if not data:
+                    raise Exception("Malformed object")
+                head += d.decompress(d.unconsumed_tail + data, INFO_CHUNK)
+        x = head.find(b' ')
+        y = head.find(b'\x00', x)
+        return head[0:x], int(head[x+1:y])
+
+    # takes the sha and returns (obj_type, size, iterator of content chunks) without ever
+    # holding the whole object in memory (packed deltas excepted).
+    @staticmethod
+    def object_stream(repo, sha):
+        pack = pack_find(repo, sha)
+        if pack:
+            return pack.stream(sha, STREAM_CHUNK)
+
+        path = repo_file(repo, "objects", sha[0:2], sha[2:])
+
+        if not (path and os.path.isfile(path)):
+            pack_list(repo, reload=True)
+            pack = pack_find(repo, sha)
+            if not pack:
+                raise Exception("No object exists here")
+            return pack.stream(sha, STREAM_CHUNK)
+
+        f = open(path, "rb")
+        chunks = inflate_iter(iter(lambda: f.read(STREAM_CHUNK), b''), STREAM_CHUNK)
+
+        # b'blob{size} \x00{content}' -> the header is somewhere in the first chunk(s)
+        head = b''
+        for data in chunks:
+            head += data
+            if b'\x00' in head:
+                break
+        x = head.find(b' ')
+        y = head.find(b'\x00', x)
+        if x < 0 or y < 0:
+            f.close()
+            raise Exception("Malformed object")
+
+        def content():
+            with f:
+                if y + 1 < len(head):
+                    yield head[y+1:]
+                yield from chunks
+
+        return head[0:x], int(head[x+1:y]), content()
+
+    # takes the sha and returns the class according to the type of object. 
+    # Goes through the object cache, so the returned object may be shared: don't modify it.
+    @staticmethod
+    def object_read(repo, sha):
+        obj = object_cache.get(sha)
+        if obj is not None:
+            return obj
+
+        obj_type, content = GITObject.object_read_raw(repo, sha)
+
+        from common.blob.blob_obj import GITBlob
+        from common.tag.tag_obj import GITTag
+        from common.tree.tree_obj import GITTree
+        from common.commit.commit_obj import GITCommit
+        match obj_type:
+            case b'commit': c=GITCommit
+            case b'tree'  : c=GITTree
+            case b'tag'   : c=GITTag
+            case b'blob'  : c=GITBlob
+            case _:
+                raise Exception("I dont know what object this is")
+        
+        obj = c(content)
+        object_cache.put(sha, obj, len(content))
+        return obj
@@ -0,0 +1,236 @@
+import zlib
+
+# Pack entry types. Same numbering git uses so the files stay readable by git tooling.
+OBJ_COMMIT = 1
+OBJ_TREE = 2
+OBJ_BLOB = 3
+OBJ_TAG = 4
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+
+type_nums = {b"commit": OBJ_COMMIT, b"tree": OBJ_TREE, b"blob": OBJ_BLOB, b"tag": OBJ_TAG}
+type_names = {v: k for k, v in type_nums.items()}
+
+# Size of the blocks of the base object that get indexed while searching for copies
+DELTA_BLOCK = 16
+# Biggest run a single copy instruction covers (git never emits more either)
+DELTA_MAX_COPY = 0x10000
+# Biggest literal run a single insert instruction covers
+DELTA_MAX_INSERT = 0x7F
+
+
+# Inflates a zlib stream given as an iterable of compressed chunks, yielding at most
+# max_length bytes at a time so a badly compressible object never lands in memory whole.
+def inflate_iter(chunks, max_length):
+    d = zlib.decompressobj()
+    for chunk in chunks:
+        data = d.decompress(chunk, max_length)
+        while True:
+            if data:
+                yield data
+            if not d.unconsumed_tail:
+                break
+            data = d.decompress(d.unconsumed_tail, max_length)
+        if d.eof:
+            return
+    raise Exception("Truncated zlib stream")
+
+
+# Entry header: 3 bits of type and a little endian size in 4 + 7*n bits
+def entry_header_encode(type_num, size):
+    c = (type_num << 4) | (size & 0x0F)
+    size >>= 4
+    ret = bytearray()
+    while size:
+        ret.append(c | 0x80)
+        c = size & 0x7F
+        size >>= 7
+    ret.append(c)
+    return bytes(ret)
+
+
+def entry_header_decode(buf, pos):
+    c = buf[pos]
+    pos += 1
+    type_num = (c >> 4) & 0x07
+    size = c & 0x0F
+    shift = 4
+    while c & 0x80:
+        c = buf[pos]
+        pos += 1
+        size |= (c & 0x7F) << shift
+        shift += 7
+    return pos, type_num, size
+
+
+# Negative offset of an ofs-delta base, big endian with the "+1 per byte" twist git uses
+def ofs_encode(offset):
+    ret = [offset & 0x7F]
+    offset >>= 7
+    while offset:
+        offset -= 1
+        ret.append(0x80 | (offset & 0x7F))
+        offset >>= 7
+    return bytes(reversed(ret))
+
+
+def ofs_decode(buf, pos):
+    c = buf[pos]
+    pos += 1
+    offset = c & 0x7F
+    while c & 0x80:
+        c = buf[pos]
+        pos += 1
+        offset = ((offset + 1) << 7) | (c & 0x7F)
+    return pos, offset
+
+
+# Sizes at the start of a delta: plain little endian base-128
+def varint_encode(n):
+    ret = bytearray()
+    while True:
+        c = n & 0x7F
+        n >>= 7
+        if n:
+            ret.append(c | 0x80)
+        else:
+            ret.append(c)
+            return bytes(ret)
+
+
+def varint_decode(buf, pos):
+    n = 0
+    shift = 0
+    while True:
+        c = buf[pos]
+        pos += 1
+        n |= (c & 0x7F) << shift
+        shift += 7
+        if not c & 0x80:
+            return pos, n
+
+
+# Maps every aligned block of the base to its first offset. Built once per base and
+# reused for every target that gets tried against it.
+def delta_index(base):
+    index = dict()
+    for i in range(0, len(base) - DELTA_BLOCK + 1, DELTA_BLOCK):
+        index.setdefault(base[i : i + DELTA_BLOCK], i)
+    return index
+
+
+def _match_len(base, bpos, target, tpos):
+    length = 0
+    limit = min(len(base) - bpos, len(target) - tpos)
+    # compare big slices first, then finish byte by byte
+    step = 4096
+    while length + step <= limit and base[bpos + length : bpos + length + step] == target[tpos + length : tpos + length + step]:
+        length += step
+    while length < limit and base[bpos + length] == target[tpos + length]:
+        length += 1
+    return length
+
+
+def _delta_insert(out, data):
+    for i in range(0, len(data), DELTA_MAX_INSERT):
+        chunk = data[i : i + DELTA_MAX_INSERT]
+        out.append(len(chunk))
+        out += chunk
+
+
+def _delta_copy(out, offset, size):
+    while size:
+        n = min(size, DELTA_MAX_COPY)
+        op = 0x80
+        args = bytearray()
+        for b in range(4):
+            byte = (offset >> (8 * b)) & 0xFF
+            if byte:
+                op |= 1 << b
+                args.append(byte)
+        encoded = 0 if n == DELTA_MAX_COPY else n
+        for b in range(3):
+            byte = (encoded >> (8 * b)) & 0xFF
+            if byte:
+                op |= 1 << (4 + b)
+                args.append(byte)
+        out.append(op)
+        out += args
+        offset += n
+        size -= n
+
+
+# Builds a git style delta (copy/insert instructions) that turns base into target.
+# Returns None as soon as the delta grows past max_size, so hopeless bases are cheap to reject.
+def delta_create(base, target, index=None, max_size=None):
+    if index is None:
+        index = delta_index(base)
+
+    out = bytearray(varint_encode(len(base)) + varint_encode(len(target)))
+    total = len(target)
+    insert_start = 0
+    i = 0
+
+    while i + DELTA_BLOCK <= total:
+        offset = index.get(target[i : i + DELTA_BLOCK])
+        if offset is None:
+            i += 1
+            if max_size and len(out) + (i - insert_start) > max_size:
+                return None
+            continue
+
+        length = _match_len(base, offset, target, i)
+        # grow the match backwards into the pending literal bytes
+        while i > insert_start and offset > 0 and target[i - 1] == base[offset - 1]:
+            i -= 1
+            offset -= 1
+            length += 1
+
+        _delta_insert(out, target[insert_start:i])
+        _delta_copy(out, offset, length)
+        i += length
+        insert_start = i
+
+        if max_size and len(out) > max_size:
+            return None
+
+    _delta_insert(out, target[insert_start:])
+    if max_size and len(out) > max_size:
+        return None
+    return bytes(out)
+
+
+def delta_apply(base, delta):
+    pos, src_size = varint_decode(delta, 0)
+    pos, tgt_size = varint_decode(delta, pos)
+    if src_size != len(base):
+        raise Exception("Delta base size does not match")
+
+    out = bytearray()
+    total = len(delta)
+    while pos < total:
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            offset = 0
+            size = 0
+            for b in range(4):
+                if op & (1 << b):
+                    offset |= delta[pos] << (8 * b)
+                    pos += 1
+            for b in range(3):
+                if op & (1 << (4 + b)):
+                    size |= delta[pos] << (8 * b)
+                    pos += 1
+            if size == 0:
+                size = DELTA_MAX_COPY
+            out += base[offset : offset + size]
+        elif op:
+            out += delta[pos : pos + op]
+            pos += op
+        else:
+            raise Exception("Invalid delta instruction")
+
+    if len(out) != tgt_size:
+        raise Exception("Delta result size does not match")
+    return bytes(out)
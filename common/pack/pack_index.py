@@ -0,0 +1,156 @@
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+
+IDX_SIGNATURE = b"\xfftOc"
+IDX_VERSION = 2
+# Offsets that don't fit in 31 bits live in a separate table of 8 byte offsets
+IDX_LARGE_OFFSET = 0x80000000
+
+
+# Lets bisect look at the sorted sha table of the mmap without copying it out
+class _ShaTable(object):
+    def __init__(self, data, start, count):
+        self.data = data
+        self.start = start
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        pos = self.start + 20 * i
+        return self.data[pos : pos + 20]
+
+
+# A version 2 pack index (.idx), same layout as git's:
+# signature + version, 256 entry fanout table, sorted raw shas, crc32s, offsets,
+# large offsets, then the pack checksum and a checksum of the index itself.
+# fanout[b] is the number of objects whose first sha byte is <= b, so a lookup
+# is one fanout step to narrow the range followed by a bisect inside it.
+class GITPackIndex(object):
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.data[0:4] != IDX_SIGNATURE:
+            raise Exception(f"Not a pack index: {path}")
+        version = struct.unpack_from(">I", self.data, 4)[0]
+        if version != IDX_VERSION:
+            raise Exception(f"Unsupported pack index version {version}")
+
+        self.fanout = struct.unpack_from(">256I", self.data, 8)
+        self.count = self.fanout[255]
+        self.shas_start = 8 + 256 * 4
+        self.crcs_start = self.shas_start + 20 * self.count
+        self.offsets_start = self.crcs_start + 4 * self.count
+        self.large_start = self.offsets_start + 4 * self.count
+        self.table = _ShaTable(self.data, self.shas_start, self.count)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, sha):
+        return self.position(sha) is not None
+
+    def position(self, sha):
+        if len(sha) != 40:
+            return None
+        try:
+            raw = bytes.fromhex(sha)
+        except ValueError:
+            return None
+        first = raw[0]
+        lo = self.fanout[first - 1] if first else 0
+        hi = self.fanout[first]
+        i = bisect.bisect_left(self.table, raw, lo, hi)
+        if i < hi and self.table[i] == raw:
+            return i
+        return None
+
+    # Position of the first sha >= the (hex, possibly odd length) prefix
+    def prefix_position(self, prefix):
+        raw = bytes.fromhex(prefix if len(prefix) % 2 == 0 else prefix + "0")
+        first = raw[0]
+        lo = self.fanout[first - 1] if first else 0
+        hi = self.fanout[first]
+        return bisect.bisect_left(self.table, raw, lo, hi)
+
+    def prefix_shas(self, prefix):
+        ret = list()
+        i = self.prefix_position(prefix)
+        while i < self.count:
+            sha = self.sha_at(i)
+            if not sha.startswith(prefix):
+                break
+            ret.append(sha)
+            i += 1
+        return ret
+
+    def sha_at(self, i):
+        return self.table[i].hex()
+
+    def crc_at(self, i):
+        return struct.unpack_from(">I", self.data, self.crcs_start + 4 * i)[0]
+
+    def offset_at(self, i):
+        offset = struct.unpack_from(">I", self.data, self.offsets_start + 4 * i)[0]
+        if offset & IDX_LARGE_OFFSET:
+            large = offset & ~IDX_LARGE_OFFSET
+            offset = struct.unpack_from(">Q", self.data, self.large_start + 8 * large)[0]
+        return offset
+
+    def offset(self, sha):
+        i = self.position(sha)
+        if i is None:
+            return None
+        return self.offset_at(i)
+
+    def shas(self):
+        for i in range(self.count):
+            yield self.sha_at(i)
+
+    def pack_checksum(self):
+        return self.data[-40:-20]
+
+
+# entries: iterable of (sha, offset, crc32). Writes to a temp file first and renames it into place.
+def pack_index_write(path, entries, pack_checksum):
+    entries = sorted(entries)
+
+    fanout = [0] * 256
+    for sha, _, _ in entries:
+        fanout[int(sha[0:2], 16)] += 1
+    total = 0
+    for i in range(256):
+        total += fanout[i]
+        fanout[i] = total
+
+    out = bytearray(IDX_SIGNATURE)
+    out += struct.pack(">I", IDX_VERSION)
+    out += struct.pack(">256I", *fanout)
+    for sha, _, _ in entries:
+        out += bytes.fromhex(sha)
+    for _, _, crc in entries:
+        out += struct.pack(">I", crc)
+
+    large = list()
+    for _, offset, _ in entries:
+        if offset < IDX_LARGE_OFFSET:
+            out += struct.pack(">I", offset)
+        else:
+            out += struct.pack(">I", IDX_LARGE_OFFSET | len(large))
+            large.append(offset)
+    for offset in large:
+        out += struct.pack(">Q", offset)
+
+    out += pack_checksum
+    out += hashlib.sha1(out).digest()
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(out)
+    os.replace(tmp_path, path)
@@ -0,0 +1,254 @@
+import collections
+import hashlib
+import mmap
+import os
+import zlib
+from helpers.repo.helpers import repo_dir
+from common.pack.pack_index import GITPackIndex, pack_index_write
+from common.pack.pack_helper import (
+    OBJ_OFS_DELTA,
+    OBJ_REF_DELTA,
+    type_nums,
+    type_names,
+    entry_header_encode,
+    entry_header_decode,
+    ofs_encode,
+    ofs_decode,
+    delta_index,
+    delta_create,
+    delta_apply,
+    varint_decode,
+    inflate_iter,
+)
+
+# How much compressed data is handed to zlib at a time while inflating an entry
+INFLATE_CHUNK = 8192
+
+
+# A packfile: b'PACK' + version + object count, the entries, then a sha1 of everything before it.
+# Every entry is a type/size header followed by zlib data. Delta entries point to their base
+# either by a negative offset (ofs delta) or by sha (ref delta).
+# Lookups go through the companion .idx file; a pack without one gets indexed on first load.
+class GITPack(object):
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.data[0:4] != b"PACK":
+            raise Exception(f"Not a packfile: {path}")
+        version = int.from_bytes(self.data[4:8], "big")
+        if version != 2:
+            raise Exception(f"Unsupported pack version {version}")
+        self.count = int.from_bytes(self.data[8:12], "big")
+
+        self.idx_path = path[: -len(".pack")] + ".idx"
+        if not os.path.isfile(self.idx_path):
+            pack_index_write(self.idx_path, self.scan(), self.data[-20:])
+        self.index = GITPackIndex(self.idx_path)
+
+    def __contains__(self, sha):
+        return sha in self.index
+
+    def shas(self):
+        return self.index.shas()
+
+    # Walks every entry once and works out (sha, offset, crc32) of each object
+    def scan(self):
+        entries = list()
+        offsets = dict()
+        pos = 12
+        for _ in range(self.count):
+            start = pos
+            pos, type_num, _ = entry_header_decode(self.data, pos)
+            if type_num == OBJ_OFS_DELTA:
+                pos, _ = ofs_decode(self.data, pos)
+            elif type_num == OBJ_REF_DELTA:
+                pos += 20
+            pos, _ = self.inflate(pos)
+
+            obj_type, content = self.read_at(start, offsets.get)
+            header = obj_type + b" " + str(len(content)).encode() + b"\x00"
+            sha = hashlib.sha1(header + content).hexdigest()
+            offsets[sha] = start
+            entries.append((sha, start, zlib.crc32(self.data[start:pos])))
+        return entries
+
+    def inflate(self, pos):
+        d = zlib.decompressobj()
+        out = bytearray()
+        while not d.eof:
+            chunk = self.data[pos : pos + INFLATE_CHUNK]
+            if not chunk:
+                raise Exception(f"Truncated packfile: {self.path}")
+            out += d.decompress(chunk)
+            pos += len(chunk)
+        return pos - len(d.unused_data), bytes(out)
+
+    def read(self, sha):
+        return self.read_at(self.index.offset(sha))
+
+    # (obj_type, size) without inflating the object: the entry header has both, except for
+    # deltas, whose type is the one at the end of their base chain and whose size is the
+    # second number at the start of the delta data
+    def info(self, sha):
+        return self.info_at(self.index.offset(sha))
+
+    def info_at(self, offset):
+        pos, type_num, size = entry_header_decode(self.data, offset)
+        if type_num == OBJ_OFS_DELTA:
+            pos, rel = ofs_decode(self.data, pos)
+            base_offset = offset - rel
+        elif type_num == OBJ_REF_DELTA:
+            base_sha = self.data[pos : pos + 20].hex()
+            base_offset = self.index.offset(base_sha)
+            if base_offset is None:
+                raise Exception(f"Delta base {base_sha} is missing from {self.path}")
+            pos += 20
+        else:
+            return type_names[type_num], size
+
+        # two varints of at most 10 bytes each
+        head = zlib.decompressobj().decompress(self.data[pos : pos + INFLATE_CHUNK], 20)
+        pos, _ = varint_decode(head, 0)
+        _, size = varint_decode(head, pos)
+        return self.info_at(base_offset)[0], size
+
+    # Returns (obj_type, size, iterator of content chunks). Plain entries are inflated as they
+    # are consumed; deltas need their whole base anyway, so those come out in one piece.
+    def stream(self, sha, max_length=INFLATE_CHUNK):
+        offset = self.index.offset(sha)
+        pos, type_num, size = entry_header_decode(self.data, offset)
+        if type_num in (OBJ_OFS_DELTA, OBJ_REF_DELTA):
+            obj_type, content = self.read_at(offset)
+            return obj_type, len(content), iter([content])
+
+        chunks = (self.data[p : p + INFLATE_CHUNK] for p in range(pos, len(self.data), INFLATE_CHUNK))
+        return type_names[type_num], size, inflate_iter(chunks, max_length)
+
+    # Returns (obj_type, content) of the entry at offset, resolving delta chains on the way
+    def read_at(self, offset, find_offset=None):
+        if find_offset is None:
+            find_offset = self.index.offset
+
+        pos, type_num, _ = entry_header_decode(self.data, offset)
+        if type_num == OBJ_OFS_DELTA:
+            pos, rel = ofs_decode(self.data, pos)
+            base_type, base = self.read_at(offset - rel, find_offset)
+            _, delta = self.inflate(pos)
+            return base_type, delta_apply(base, delta)
+        if type_num == OBJ_REF_DELTA:
+            base_sha = self.data[pos : pos + 20].hex()
+            base_offset = find_offset(base_sha)
+            if base_offset is None:
+                raise Exception(f"Delta base {base_sha} is missing from {self.path}")
+            base_type, base = self.read_at(base_offset, find_offset)
+            _, delta = self.inflate(pos + 20)
+            return base_type, delta_apply(base, delta)
+
+        _, content = self.inflate(pos)
+        return type_names[type_num], content
+
+
+# Packs loaded by this process, per repository. A new pack only shows up through
+# pack_write or an explicit reload (object_read does one when it misses).
+packs_cache = dict()
+
+
+def pack_list(repo, reload=False):
+    if reload or repo.gitdir not in packs_cache:
+        old = {p.path: p for p in packs_cache.get(repo.gitdir, [])}
+        packs = list()
+        path = repo_dir(repo, "objects", "pack")
+        if path:
+            for f in sorted(os.listdir(path)):
+                if f.startswith("pack-") and f.endswith(".pack"):
+                    full_path = os.path.join(path, f)
+                    packs.append(old.get(full_path) or GITPack(full_path))
+        packs_cache[repo.gitdir] = packs
+    return packs_cache[repo.gitdir]
+
+
+def pack_find(repo, sha):
+    for pack in pack_list(repo):
+        if sha in pack:
+            return pack
+    return None
+
+
+# Bytes of blob content kept around as delta bases. Big blobs push the oldest candidates out
+# of the window early instead of piling up next to each other.
+PACK_WINDOW_MEMORY = 64 * 1024 * 1024
+
+# Writes objects (an iterable of (sha, obj_type, size)) into one new packfile and returns its path.
+# read(sha) gives an object's content; it is called once per object, right before the object is
+# written, so nothing but the delta window is held in memory. Blobs are sorted by size and each
+# one is tried as a delta against the previous `window` blobs that fit in window_memory bytes.
+def pack_write(repo, objects, read, window=10, depth=50, window_memory=PACK_WINDOW_MEMORY):
+    objects = list(objects)
+    blobs = sorted((o for o in objects if o[1] == b"blob"), key=lambda o: o[2], reverse=True)
+    others = [o for o in objects if o[1] != b"blob"]
+
+    pack_dir = repo_dir(repo, "objects", "pack", mkdir=True)
+    tmp_path = os.path.join(pack_dir, f"tmp_pack_{os.getpid()}")
+    checksum = hashlib.sha1()
+    offsets = dict()
+    crcs = dict()
+    depths = dict()
+    # candidate bases, newest first: [sha, content, block index (built lazily)]
+    recent = collections.deque()
+    recent_size = 0
+
+    with open(tmp_path, "wb") as f:
+        def emit(buf, sha=None):
+            f.write(buf)
+            checksum.update(buf)
+            if sha:
+                crcs[sha] = zlib.crc32(buf, crcs.get(sha, 0))
+            return len(buf)
+
+        pos = emit(b"PACK" + (2).to_bytes(4, "big") + len(objects).to_bytes(4, "big"))
+
+        for sha, obj_type, _ in others + blobs:
+            content = read(sha)
+            best = None
+            if obj_type == b"blob":
+                max_size = len(content) // 2 - 20
+                for base in recent:
+                    if max_size <= 0:
+                        break
+                    if depths[base[0]] >= depth:
+                        continue
+                    if base[2] is None:
+                        base[2] = delta_index(base[1])
+                    delta = delta_create(base[1], content, index=base[2], max_size=max_size)
+                    if delta is not None:
+                        best = (base[0], delta)
+                        max_size = len(delta) - 1
+                recent.appendleft([sha, content, None])
+                recent_size += len(content)
+                while len(recent) > window or (recent_size > window_memory and len(recent) > 1):
+                    recent_size -= len(recent.pop()[1])
+
+            offsets[sha] = pos
+            if best:
+                base_sha, delta = best
+                depths[sha] = depths[base_sha] + 1
+                pos += emit(entry_header_encode(OBJ_OFS_DELTA, len(delta)) + ofs_encode(pos - offsets[base_sha]), sha)
+                pos += emit(zlib.compress(delta), sha)
+            else:
+                depths[sha] = 0
+                pos += emit(entry_header_encode(type_nums[obj_type], len(content)), sha)
+                pos += emit(zlib.compress(content), sha)
+
+        f.write(checksum.digest())
+
+    name = os.path.join(pack_dir, f"pack-{checksum.hexdigest()}")
+    # the index goes in first so nobody sees a pack they would have to index themselves
+    pack_index_write(name + ".idx", ((sha, offsets[sha], crcs[sha]) for sha in offsets), checksum.digest())
+    path = name + ".pack"
+    os.replace(tmp_path, path)
+
+    if repo.gitdir in packs_cache and not any(p.path == path for p in packs_cache[repo.gitdir]):
+        packs_cache[repo.gitdir].append(GITPack(path))
+    return path
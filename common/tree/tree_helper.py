@@ -39,8 +39,9 @@ def tree_parse_one(raw, start = 0):
     assert x-start == 5 or x-start == 6
     mode = raw[start:x]
 
+    # git writes directories as "40000": pad in front, so it reads b"040000" like ours
     if len(mode) == 5:
-        mode += b"0"
+        mode = b"0" + mode
 
     y = raw.find(b'\x00', x)
     path = raw[x+1: y]
@@ -0,0 +1,198 @@
+import heapq
+import itertools
+from common.objects import GITObject
+from common.commit.commit_graph import commit_graph_load, commit_graph_write, GENERATION_INFINITY
+from common.commit.bloom import bloom_filter_build
+from helpers.refs.helpers import ref_list, ref_resolve
+from helpers.diff.helpers import diff_tree_tree
+
+# History walkers go through commit_info/commit_parents: commits in the commit-graph are
+# answered from it without touching the object store, anything newer is read and parsed.
+
+def commit_kvlm_list(kvlm, key):
+    value = kvlm.get(key)
+    if value is None:
+        return []
+    if type(value) != list:
+        value = [value]
+    return [v.decode("ascii") for v in value]
+
+# The unix time at the end of the committer line: b"name <email> 1700000000 +0530"
+def commit_kvlm_time(kvlm):
+    line = kvlm.get(b"committer") or kvlm.get(b"author") or b""
+    parts = line.split(b" ")
+    try:
+        return int(parts[-2])
+    except (IndexError, ValueError):
+        return 0
+
+# (tree, [parent shas], commit time, generation); the generation is GENERATION_INFINITY
+# for commits the graph doesn't know yet
+def commit_info(repo, sha):
+    graph = commit_graph_load(repo)
+    if graph:
+        i = graph.position(sha)
+        if i is not None:
+            tree, parents, ctime, generation = graph.data_at(i)
+            return tree, [graph.sha_at(p) for p in parents], ctime, generation
+
+    obj = GITObject.object_read(repo, sha)
+    if obj.obj_type != b"commit":
+        raise Exception(f"{sha} is not a commit")
+    tree = obj.kvlm[b"tree"].decode("ascii")
+    return tree, commit_kvlm_list(obj.kvlm, b"parent"), commit_kvlm_time(obj.kvlm), GENERATION_INFINITY
+
+def commit_parents(repo, sha):
+    return commit_info(repo, sha)[1]
+
+
+# Commits the refs and HEAD point at, with tags peeled
+def commit_tips(repo):
+    shas = list()
+
+    def collect(refs):
+        for v in refs.values():
+            if type(v) == dict:
+                collect(v)
+            elif v:
+                shas.append(v)
+
+    collect(ref_list(repo))
+    head = ref_resolve(repo, "HEAD")
+    if head:
+        shas.append(head)
+
+    tips = list()
+    for sha in shas:
+        obj = GITObject.object_read(repo, sha)
+        while obj.obj_type == b"tag":
+            sha = obj.kvlm[b"object"].decode("ascii")
+            obj = GITObject.object_read(repo, sha)
+        if obj.obj_type == b"commit" and sha not in tips:
+            tips.append(sha)
+    return tips
+
+
+# Rewrites the commit-graph with every commit reachable from the refs and HEAD, with a
+# changed-path filter for each. Filters already in the old graph are kept as they are.
+def commit_graph_update(repo):
+    commits = dict()
+    stack = commit_tips(repo)
+    while stack:
+        sha = stack.pop()
+        if sha in commits:
+            continue
+        tree, parents, ctime, _ = commit_info(repo, sha)
+        commits[sha] = (tree, parents, ctime)
+        stack.extend(p for p in parents if p not in commits)
+
+    graph = commit_graph_load(repo)
+    blooms = dict()
+    for sha, (tree, parents, _) in commits.items():
+        i = graph.position(sha) if graph else None
+        bloom = graph.bloom_at(i) if i is not None else None
+        if bloom is None:
+            parent_tree = commits[parents[0]][0] if parents else None
+            paths = [path for _, path, _, _ in diff_tree_tree(repo, parent_tree, tree)]
+            bloom = bloom_filter_build(paths)
+        blooms[sha] = bytes(bloom)
+
+    commit_graph_write(repo, commits, blooms)
+    return len(commits)
+
+
+
+# Best common ancestors of two commits, the same answer as git merge-base --all: common
+# ancestors that aren't an ancestor of another common ancestor. Criss-cross merges have
+# more than one. The walk always takes the commit with the highest generation (then the
+# newest) first, so a commit is only looked at after everything that can reach it. What
+# lies below a common ancestor is marked stale, and the walk stops as soon as nothing but
+# stale commits is left in the queue.
+MERGE_PARENT1 = 1
+MERGE_PARENT2 = 2
+MERGE_STALE = 4
+MERGE_BOTH = MERGE_PARENT1 | MERGE_PARENT2
+
+def merge_bases(repo, one, two):
+    if one == two:
+        return [one]
+
+    infos = dict()
+
+    def info(sha):
+        if sha not in infos:
+            infos[sha] = commit_info(repo, sha)
+        return infos[sha]
+
+    flags = dict()
+    heap = list()
+    order = itertools.count()
+    # heap entries per commit, and how many entries belong to commits that aren't stale
+    queued = dict()
+    active = 0
+
+    def push(sha):
+        nonlocal active
+        _, _, ctime, generation = info(sha)
+        heapq.heappush(heap, (-generation, -ctime, next(order), sha))
+        queued[sha] = queued.get(sha, 0) + 1
+        if not flags[sha] & MERGE_STALE:
+            active += 1
+
+    flags[one] = MERGE_PARENT1
+    flags[two] = MERGE_PARENT2
+    push(one)
+    push(two)
+
+    candidates = list()
+    while active:
+        sha = heapq.heappop(heap)[3]
+        queued[sha] -= 1
+        f = flags[sha]
+        if not f & MERGE_STALE:
+            active -= 1
+
+        if f & MERGE_BOTH == MERGE_BOTH and not f & MERGE_STALE:
+            if sha not in candidates:
+                candidates.append(sha)
+            f |= MERGE_STALE
+
+        for parent in info(sha)[1]:
+            old = flags.get(parent, 0)
+            if old & f == f:
+                continue
+            flags[parent] = old | f
+            if f & MERGE_STALE and not old & MERGE_STALE:
+                active -= queued.get(parent, 0)
+            push(parent)
+
+    # candidates that ended up below another candidate are stale by now
+    candidates = [c for c in candidates if not flags[c] & MERGE_STALE]
+    return merge_bases_reduce(candidates, info)
+
+
+# Drops the commits that are ancestors of another commit of the list
+def merge_bases_reduce(shas, info):
+    if len(shas) < 2:
+        return shas
+    return [sha for sha in shas if not commit_reaches([o for o in shas if o != sha], sha, info)]
+
+
+# Whether target is an ancestor of one of the tips. Nothing with a lower generation than the
+# target can lead to it, so those parts of history are never walked.
+def commit_reaches(tips, target, info):
+    target_generation = info(target)[3]
+    seen = set(tips)
+    stack = list(tips)
+    while stack:
+        sha = stack.pop()
+        if sha == target:
+            return True
+        _, parents, _, generation = info(sha)
+        if generation < target_generation:
+            continue
+        for parent in parents:
+            if parent not in seen:
+                seen.add(parent)
+                stack.append(parent)
+    return False
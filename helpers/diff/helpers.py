@@ -0,0 +1,136 @@
+import bisect
+from common.objects import GITObject
+from stage.indexfile import index_entry_key
+
+# Both diffs are generators of (status, path, old_sha, new_sha) with status one of
+# "A" (added), "M" (modified) or "D" (deleted), in path order.
+#
+# They are merge-joins over two sorted sides. Tree entries are stored sorted by name with
+# a "/" appended to directories, which is exactly the order of the full paths below them,
+# so a tree can be joined directly against another tree or against the (path sorted) index.
+# Subtrees with the same sha on both sides are skipped without being read.
+
+def tree_leaf_is_tree(leaf):
+    return leaf.mode.startswith(b"04")
+
+def tree_leaf_key(leaf):
+    return leaf.path + "/" if tree_leaf_is_tree(leaf) else leaf.path
+
+def tree_items(repo, sha):
+    if not sha:
+        return []
+    return GITObject.object_read(repo, sha).items
+
+# Every file below a tree, as (path, sha, mode)
+def tree_walk(repo, sha, prefix=""):
+    for leaf in tree_items(repo, sha):
+        path = prefix + leaf.path
+        if tree_leaf_is_tree(leaf):
+            yield from tree_walk(repo, leaf.sha, path + "/")
+        else:
+            yield path, leaf.sha, leaf.mode
+
+# sha of whatever sits at path (a blob or a subtree) in the tree, None when nothing does.
+# "" and "." are the tree itself. Only the trees along the path are read.
+def tree_path_sha(repo, tree, path):
+    if path in ("", "."):
+        return tree
+    sha = tree
+    is_tree = True
+    for part in path.split("/"):
+        if not is_tree:
+            return None
+        for leaf in tree_items(repo, sha):
+            if leaf.path == part:
+                sha = leaf.sha
+                is_tree = tree_leaf_is_tree(leaf)
+                break
+        else:
+            return None
+    return sha
+
+def _diff_leaf_gone(repo, leaf, path):
+    if tree_leaf_is_tree(leaf):
+        for p, sha, _ in tree_walk(repo, leaf.sha, path + "/"):
+            yield "D", p, sha, None
+    else:
+        yield "D", path, leaf.sha, None
+
+def _diff_leaf_new(repo, leaf, path):
+    if tree_leaf_is_tree(leaf):
+        for p, sha, _ in tree_walk(repo, leaf.sha, path + "/"):
+            yield "A", p, None, sha
+    else:
+        yield "A", path, None, leaf.sha
+
+
+def diff_tree_tree(repo, old, new, prefix=""):
+    if old == new:
+        return
+
+    old_items = sorted(tree_items(repo, old), key=tree_leaf_key)
+    new_items = sorted(tree_items(repo, new), key=tree_leaf_key)
+    i = j = 0
+
+    while i < len(old_items) or j < len(new_items):
+        a = old_items[i] if i < len(old_items) else None
+        b = new_items[j] if j < len(new_items) else None
+
+        if b is None or (a is not None and tree_leaf_key(a) < tree_leaf_key(b)):
+            yield from _diff_leaf_gone(repo, a, prefix + a.path)
+            i += 1
+        elif a is None or tree_leaf_key(b) < tree_leaf_key(a):
+            yield from _diff_leaf_new(repo, b, prefix + b.path)
+            j += 1
+        else:
+            path = prefix + a.path
+            if a.sha == b.sha and a.mode == b.mode:
+                pass
+            elif tree_leaf_is_tree(a):
+                yield from diff_tree_tree(repo, a.sha, b.sha, path + "/")
+            else:
+                yield "M", path, a.sha, b.sha
+            i += 1
+            j += 1
+
+
+def index_entry_mode(entry):
+    return f"{entry.mode_type:02o}{entry.mode_perms:04o}".encode("ascii")
+
+def diff_tree_index(repo, tree, index):
+    yield from _diff_tree_index(repo, tree, index, "", 0, len(index.entries))
+
+# Diffs the tree at `prefix` against index.entries[lo:hi], which are exactly the entries below it
+def _diff_tree_index(repo, tree, index, prefix, lo, hi):
+    entries = index.entries
+
+    # the cache-tree already knows the sha the index would produce for this directory
+    cached = index.cache_tree.get(prefix[:-1])
+    if tree and cached and cached[1] == tree and cached[0] == hi - lo:
+        return
+
+    i = lo
+    for leaf in sorted(tree_items(repo, tree), key=tree_leaf_key):
+        key = prefix + tree_leaf_key(leaf)
+
+        # index entries sorting before this leaf aren't in the tree at all
+        while i < hi and entries[i].name < key:
+            yield "A", entries[i].name, None, entries[i].sha
+            i += 1
+
+        if tree_leaf_is_tree(leaf):
+            # '0' is the character right after '/', so this is the end of everything under key
+            j = bisect.bisect_left(entries, key[:-1] + "0", i, hi, key=index_entry_key)
+            yield from _diff_tree_index(repo, leaf.sha, index, key, i, j)
+            i = j
+        elif i < hi and entries[i].name == key:
+            entry = entries[i]
+            if entry.sha != leaf.sha or index_entry_mode(entry) != leaf.mode:
+                yield "M", key, leaf.sha, entry.sha
+            i += 1
+        else:
+            yield "D", key, leaf.sha, None
+
+    while i < hi:
+        yield "A", entries[i].name, None, entries[i].sha
+        i += 1
@@ -1,17 +1,27 @@
 import re
 import os
-from common.blob.blob_obj import GITBlob
-from common.tag.tag_obj import GITTag
-from common.tree.tree_obj import GITTree
-from common.commit.commit_obj import GITCommit
+import bisect
+import time
 from common.objects import GITObject
 from helpers.repo.helpers import repo_dir
-from helpers.refs.helpers import ref_resolve
+from helpers.refs.helpers import ref_resolve, ref_candidates
+from common.pack.pack_obj import pack_list
+from common.commit.commit_graph import commit_graph_load
 
 
-def object_hash(fd, fmt, repo=None):
+def object_hash(fd, fmt, repo=None, verbose=True):
+    # blobs never need parsing, so they are streamed straight from the file
+    if fmt == b'blob':
+        size = os.fstat(fd.fileno()).st_size
+        return GITObject.object_write_stream(fd, size, fmt, repo, verbose)
+
     data = fd.read()
 
+    # imported here, like in object_read: most commands never build objects from files
+    from common.blob.blob_obj import GITBlob
+    from common.tag.tag_obj import GITTag
+    from common.tree.tree_obj import GITTree
+    from common.commit.commit_obj import GITCommit
     match fmt:
         case b'commit' : obj=GITCommit(data)
         case b'tree'   : obj=GITTree(data)
@@ -21,6 +31,74 @@ def object_hash(fd, fmt, repo=None):
 
     return GITObject.object_write(obj, repo)
 
+# shas of every loose object (the .git/objects/xx/yyyy... files)
+def object_loose_list(repo):
+    path = repo_dir(repo, "objects")
+    ret = list()
+    for d in sorted(os.listdir(path)):
+        if len(d) != 2 or not os.path.isdir(os.path.join(path, d)):
+            continue
+        for f in sorted(os.listdir(os.path.join(path, d))):
+            if len(f) == 38:
+                ret.append(d + f)
+    return ret
+
+# Sorted shas of the loose objects of one fanout directory ("ab"), kept per repository.
+# Any object added or removed bumps the directory's mtime, which is when it is listed again
+# (a listing taken in the same tick as the last change is not trusted).
+loose_names_cache = dict()
+
+def object_loose_names(repo, fanout):
+    path = repo_dir(repo, "objects", fanout)
+    if not path:
+        return []
+
+    mtime = os.stat(path).st_mtime_ns
+    key = (repo.gitdir, fanout)
+    cached = loose_names_cache.get(key)
+    if cached and cached[0] == mtime and mtime < cached[1]:
+        return cached[2]
+
+    listed = time.time_ns()
+    names = sorted(fanout + f for f in os.listdir(path) if len(f) == 38)
+    loose_names_cache[key] = (mtime, listed, names)
+    return names
+
+# Every object (loose or packed) whose sha starts with the hex prefix
+def object_prefix_find(repo, prefix):
+    prefix = prefix.lower()
+    names = object_loose_names(repo, prefix[0:2])
+    ret = list()
+    i = bisect.bisect_left(names, prefix)
+    while i < len(names) and names[i].startswith(prefix):
+        ret.append(names[i])
+        i += 1
+
+    for pack in pack_list(repo):
+        for sha in pack.index.prefix_shas(prefix):
+            if sha not in ret:
+                ret.append(sha)
+    return ret
+
+# The shortest prefix (min_length at least) that no other object of the repository shares
+def object_abbrev(repo, sha, min_length=7):
+    neighbours = list()
+
+    names = object_loose_names(repo, sha[0:2])
+    i = bisect.bisect_left(names, sha)
+    neighbours += names[max(i - 1, 0) : i + 2]
+
+    for pack in pack_list(repo):
+        index = pack.index
+        i = index.prefix_position(sha)
+        neighbours += [index.sha_at(j) for j in range(max(i - 1, 0), min(i + 2, index.count))]
+
+    length = min_length
+    for other in neighbours:
+        if other != sha:
+            length = max(length, len(os.path.commonprefix([sha, other])) + 1)
+    return sha[:length]
+
 # helpers
 def object_resolve(repo, name):
     candidates = list()
@@ -33,27 +111,11 @@ def object_resolve(repo, name):
         return [ ref_resolve(repo, "HEAD") ]
 
     if hashRE.match(name):
-        name = name.lower()
-        prefix = name[0:2]
-        path = repo_dir(repo, "objects", prefix, mkdir=False)
-        if path:
-            rem = name[2:]
-            for f in os.listdir(path):
-                if f.startswith(rem):
-                    candidates.append(prefix + f)
-
-
-    as_tag = ref_resolve(repo, "refs/tags/" + name)
-    if as_tag: 
-        candidates.append(as_tag)
-
-    as_branch = ref_resolve(repo, "refs/heads/" + name)
-    if as_branch:
-        candidates.append(as_branch)
+        candidates += object_prefix_find(repo, name)
 
-    as_remote_branch = ref_resolve(repo, "refs/remotes/" + name)
-    if as_remote_branch:
-        candidates.append(as_remote_branch)
+    for sha in ref_candidates(repo, name):
+        if sha not in candidates:
+            candidates.append(sha)
 
     return candidates
 
@@ -76,7 +138,18 @@ def object_find(repo, name, obj_type=None, follow=True):
     if not obj_type:
         return sha
     
+    graph = commit_graph_load(repo)
+
     while True:
+        # a commit in the commit-graph gets to its tree without an object read
+        i = graph.position(sha) if graph else None
+        if i is not None:
+            if obj_type == b'commit':
+                return sha
+            if obj_type == b'tree' and follow:
+                return graph.data_at(i)[0]
+            return None
+
         obj = GITObject.object_read(repo, sha)
 
 
@@ -1,33 +1,157 @@
 import os
 from helpers.repo.helpers import repo_file, repo_dir
 
-def ref_resolve(repo, ref):
-    path = repo_file(repo, ref)
-    if not os.path.isfile(path):
+# Refs are read into a dict of refname ("HEAD", "refs/heads/master", ...) -> its content: a
+# sha, or "ref: <refname>" for a symbolic ref. They come from the .git/packed-refs file and
+# the loose files under .git/refs, a loose ref winning over the packed one of the same name.
+# The dict is cached per process next to the stat data of everything it was read from, and
+# read again as soon as that changes, so refs moved by another zyra or by git are seen by
+# long running commands too. Writes through ref_update drop the cache right away.
+refs_cache = dict()
+
+# Symbolic refs pointing at symbolic refs are followed this deep at most
+REF_MAX_DEPTH = 5
+
+def _ref_stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
         return None
-    
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+# Stat data of packed-refs, HEAD, every directory under refs/ (creating or deleting a ref
+# changes its directory) and every loose ref. Only stats: no file is opened.
+def refs_stamp(repo):
+    stamp = [_ref_stat(repo_file(repo, "packed-refs")), _ref_stat(repo_file(repo, "HEAD"))]
+    refs_path = repo_dir(repo, "refs")
+    if refs_path:
+        for root, _, files in os.walk(refs_path):
+            stamp.append((root, _ref_stat(root)))
+            for f in files:
+                path = os.path.join(root, f)
+                stamp.append((path, _ref_stat(path)))
+    return stamp
+
+def refs_load(repo):
+    # taken before reading, so a write racing with the read shows up on the next call
+    stamp = refs_stamp(repo)
+    cached = refs_cache.get(repo.gitdir)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    refs = packed_refs_read(repo)
+
+    refs_path = repo_dir(repo, "refs")
+    if refs_path:
+        for root, _, files in os.walk(refs_path):
+            for f in files:
+                if f.endswith(".lock"):
+                    continue
+                path = os.path.join(root, f)
+                name = os.path.relpath(path, repo.gitdir).replace(os.sep, "/")
+                with open(path, "r") as fd:
+                    data = fd.read().strip()
+                if data:
+                    refs[name] = data
+
+    head = repo_file(repo, "HEAD")
+    if head and os.path.isfile(head):
+        with open(head, "r") as fd:
+            data = fd.read().strip()
+        if data:
+            refs["HEAD"] = data
+
+    refs_cache[repo.gitdir] = (stamp, refs)
+    return refs
+
+# packed-refs: an optional "# pack-refs with: ..." header, then "{sha} {refname}" lines,
+# each maybe followed by a "^{sha}" line with what an annotated tag peels to
+def packed_refs_read(repo):
+    refs = dict()
+    path = repo_file(repo, "packed-refs")
+    if not path or not os.path.isfile(path):
+        return refs
+
     with open(path, "r") as f:
-        data = f.read()[:-1]
+        for line in f:
+            line = line.rstrip("\n")
+            if not line or line.startswith("#") or line.startswith("^"):
+                continue
+            sha, name = line.split(" ", 1)
+            refs[name] = sha
+    return refs
 
-    if data.startswith("ref: "):
-        return ref_resolve(repo, data[5:])
-    else:
-        return data
-    
-def ref_list(repo, path=None):
-    if not path:
-        path = repo_dir(repo, "refs")
+# refs: a refs_load result to resolve against, so a caller resolving many names stats the
+# refs once instead of once per name
+def ref_resolve(repo, ref, refs=None):
+    if refs is None:
+        refs = refs_load(repo)
+    for _ in range(REF_MAX_DEPTH):
+        data = refs.get(ref)
+        if data is None:
+            return None
+        if not data.startswith("ref: "):
+            return data
+        ref = data[5:]
+    raise Exception(f"Too many levels of symbolic refs at {ref}")
 
-    ret = dict()
+# Writes a loose ref (a sha, or "ref: <refname>" for a symbolic one) and drops the cache
+def ref_update(repo, ref, data):
+    path = repo_file(repo, *ref.split("/"), mkdir=True)
+    with open(path + ".lock", "w") as f:
+        f.write(data + "\n")
+    os.replace(path + ".lock", path)
+    refs_cache.pop(repo.gitdir, None)
+
+# Moves every ref under refs/ into packed-refs and deletes their loose files
+def refs_pack(repo):
+    refs = refs_load(repo)
+    packed = sorted((name, data) for name, data in refs.items()
+                    if name.startswith("refs/") and not data.startswith("ref: "))
+
+    path = repo_file(repo, "packed-refs")
+    with open(path + ".lock", "w") as f:
+        f.write("# pack-refs with: sorted \n")
+        for name, sha in packed:
+            f.write(f"{sha} {name}\n")
+    os.replace(path + ".lock", path)
 
-    for f in sorted(os.listdir(path)):
-        can = os.path.join(path, f)
+    for name, _ in packed:
+        loose = repo_file(repo, *name.split("/"))
+        if loose and os.path.isfile(loose):
+            os.unlink(loose)
+    refs_cache.pop(repo.gitdir, None)
+    return len(packed)
 
-        if os.path.isdir(can):
-            ret[f] = ref_list(repo, can)
-        else :
-            ret[f] = ref_resolve(repo, can)
+# Where a short name is looked up as a ref, in order
+REF_NAMESPACES = ("refs/tags/", "refs/heads/", "refs/remotes/")
 
+# Every distinct sha the name could mean as a ref: a full "refs/..." name, or a short name
+# in each of REF_NAMESPACES
+def ref_candidates(repo, name):
+    names = [name] if name.startswith("refs/") else list()
+    names += [ns + name for ns in REF_NAMESPACES]
+
+    refs = refs_load(repo)
+    ret = list()
+    for ref in names:
+        sha = ref_resolve(repo, ref, refs)
+        if sha and sha not in ret:
+            ret.append(sha)
+    return ret
+
+# The refs under refs/ as nested dicts, {"heads": {"master": sha}, "tags": {...}}
+def ref_list(repo):
+    refs = refs_load(repo)
+    ret = dict()
+    for name in sorted(refs):
+        if not name.startswith("refs/"):
+            continue
+        parts = name.split("/")[1:]
+        node = ret
+        for part in parts[:-1]:
+            node = node.setdefault(part, dict())
+        node[parts[-1]] = ref_resolve(repo, name, refs)
     return ret
 
 def show_ref(repo, refs, with_hash=True, prefix=""):
@@ -42,5 +166,4 @@ def show_ref(repo, refs, with_hash=True, prefix=""):
             show_ref(repo, v, with_hash=with_hash, prefix=f"{prefix}{k}")
 
 def ref_create(repo, path, sha):
-    with open(repo_file(repo, "refs", path), 'w') as f:
-        f.write(sha + "\n")
\ No newline at end of file
+    ref_update(repo, "refs/" + path, sha)
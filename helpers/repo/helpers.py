@@ -1,9 +1,10 @@
 import os
 from common.repo import GITRepository
 import configparser
-from termcolor import cprint
 
 def repo_create(path):
+    from termcolor import cprint
+
     repo = GITRepository(path, True)
 
     if os.path.exists(repo.worktree):
@@ -59,7 +60,8 @@ def repo_dir(repo, *path, mkdir=False):
             raise Exception(f"Not a directory {path}")
 
     if mkdir:
-        os.makedirs(path)
+        # exist_ok: parallel writers may race to create the same objects/xx directory
+        os.makedirs(path, exist_ok=True)
         return path
     else:
         return None
@@ -72,12 +74,21 @@ def repo_find(path=".", required=True):
     parent = os.path.realpath(os.path.join(path, ".."))
     if parent == path:
         if required:
+            from termcolor import cprint
             cprint("First initalise the zyra directory using 'zyra init' command", "purple")
         else:
             return None
     
     return repo_find(parent, required)
 
+# Threads for the parallel commands (add, status, checkout, switch): -j, or one per core
+# when it's missing or below 1. hashlib and zlib drop the GIL while they chew on a chunk,
+# so plain threads keep every core busy.
+def repo_jobs(jobs):
+    if jobs is None or jobs < 1:
+        return os.cpu_count() or 1
+    return jobs
+
 def repo_store_branch(branch_name):
     repo = repo_find()
     path = repo_file(repo, "branches")
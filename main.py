@@ -1,8 +1,36 @@
-from argparsing import argparser
+from argparsing import parse_args
 import sys
-from cmds.commands import *
-from termcolor import cprint
-import random
+import os
+import importlib
+
+# command -> (module, function). Only the module of the command being run gets imported,
+# which keeps the startup of quick commands (rev-parse, status in a shell prompt) short.
+# scripts/bench_startup.py measures it.
+commands = {
+    "commit": ("cmds.commit", "cmd_commit"),
+    "all-commits": ("cmds.commits", "cmd_commits"),
+    "branch": ("cmds.branch", "cmd_branch"),
+    "switch": ("cmds.checkout", "cmd_switch"),
+    "create-branch": ("cmds.branch", "cmd_create_branch"),
+    "b-commits": ("cmds.commits", "cmd_bcommits"),
+    "add": ("cmds.add", "cmd_add"),
+    "checkout": ("cmds.checkout", "cmd_checkout"),
+    "init": ("cmds.init", "cmd_init"),
+    "cat-file": ("cmds.objects", "cmd_cat_file"),
+    "hash-object": ("cmds.objects", "cmd_hash_obj"),
+    "log": ("cmds.log", "cmd_log"),
+    "show-ref": ("cmds.refs", "cmd_show_ref"),
+    "tag": ("cmds.tag", "cmd_tag"),
+    "rev-parse": ("cmds.refs", "cmd_rev_parse"),
+    "status": ("cmds.status", "cmd_status"),
+    "rm": ("cmds.rm", "cmd_rm"),
+    "repack": ("cmds.repack", "cmd_repack"),
+    "diff-tree": ("cmds.diff", "cmd_diff_tree"),
+    "commit-graph": ("cmds.graph", "cmd_commit_graph"),
+    "merge-base": ("cmds.graph", "cmd_merge_base"),
+    "pack-refs": ("cmds.refs", "cmd_pack_refs"),
+    "gc": ("cmds.gc", "cmd_gc"),
+}
 
 colors = [
     ["on_light_cyan"],
@@ -24,42 +52,16 @@ colors = [
 
 
 def main(argvs=sys.argv[1:]):
-    args = argparser.parse_args(argvs)
+    args = parse_args(argvs)
+
+    # the banner is opt-in (ZYRA_BANNER=1), and never in the batch modes, whose stdout is
+    # read by programs
+    batch = getattr(args, "batch", False) or getattr(args, "batch_check", False) or getattr(args, "stdin_paths", False)
+    if os.environ.get("ZYRA_BANNER") and not batch:
+        from termcolor import cprint
+        import random
 
-    cprint(f"zyra rolling...", (196, 251, 174), random.choice(colors)[0], ["bold", "blink"])
+        cprint(f"zyra rolling...", (196, 251, 174), random.choice(colors)[0], ["bold", "blink"])
 
-    match args.command:
-        case "commit":
-            cmd_commit(args)
-        case "all-commits":
-            cmd_commits(args)
-        case "branch":
-            cmd_branch(args)
-        case "switch":
-            cmd_switch(args)
-        case "create-branch":
-            cmd_create_branch(args)
-        case "b-commits":
-            cmd_bcommits(args)
-        case "add":
-            cmd_add(args)
-        case "checkout":
-            cmd_checkout(args)
-        case "init":
-            cmd_init(args)
-        case "cat-file":
-            cmd_cat_file(args)
-        case "hash-object":
-            cmd_hash_obj(args)
-        case "log":
-            cmd_log(args)
-        case "show-ref":
-            cmd_show_ref(args)
-        case "tag":
-            cmd_tag(args)
-        case "rev-parse":
-            cmd_rev_parse(args)
-        case "status":
-            cmd_status(args)
-        case "rm":
-            cmd_rm(args)
+    module, func = commands[args.command]
+    getattr(importlib.import_module(module), func)(args)
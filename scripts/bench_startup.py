@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# Startup time of the quick zyra commands, the ones shell prompts call on every prompt.
+# Run it from inside a zyra repository:
+#
+#   python /path/to/zyra/scripts/bench_startup.py [-n runs] [--max-ms limit]
+#
+# Prints the median wall time of each command and of a bare "python -c pass" for
+# comparison. With --max-ms it exits with status 1 when a command is slower than that.
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ZYRA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "zyra.py")
+
+COMMANDS = [
+    ["rev-parse", "HEAD"],
+    ["status"],
+    ["cat-file", "--batch-check"],
+]
+
+
+def bench(argv, runs):
+    times = list()
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure zyra startup time")
+    parser.add_argument("-n", dest="runs", type=int, default=20, help="Runs per command")
+    parser.add_argument("--max-ms", dest="max_ms", type=float, default=None,
+                        help="Fail when a command's median is above this many milliseconds")
+    args = parser.parse_args()
+
+    baseline = bench([sys.executable, "-c", "pass"], args.runs)
+    print(f"{'python -c pass':<28}{baseline:8.1f} ms")
+
+    slow = False
+    for command in COMMANDS:
+        ms = bench([sys.executable, ZYRA] + command, args.runs)
+        print(f"{'zyra ' + ' '.join(command):<28}{ms:8.1f} ms")
+        if args.max_ms is not None and ms > args.max_ms:
+            slow = True
+
+    sys.exit(1 if slow else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+
+# The cache-tree ("TREE") index extension, in git's format. It remembers the tree sha of
+# every directory whose index entries haven't changed since that tree was last written.
+# Each node, parents before children:
+#   {name}\x00{entry count} {number of subtrees}\n{20 byte sha}
+# An entry count of -1 marks an invalidated node, which has no sha.
+#
+# In memory it is a dict: directory path ("" is the root) -> (entry count, sha).
+# Invalidated directories simply aren't in it.
+
+def cache_tree_parse(data):
+    ret = dict()
+
+    def node(pos, parent):
+        nul = data.index(b"\x00", pos)
+        name = data[pos:nul].decode("utf8")
+        path = name if not parent else parent + "/" + name
+        lf = data.index(b"\n", nul)
+        count, subtrees = (int(x) for x in data[nul + 1 : lf].split(b" "))
+        pos = lf + 1
+        if count >= 0:
+            ret[path] = (count, data[pos : pos + 20].hex())
+            pos += 20
+        for _ in range(subtrees):
+            pos = node(pos, path)
+        return pos
+
+    if data:
+        node(0, "")
+    return ret
+
+
+def cache_tree_serialize(cache_tree):
+    # invalid directories still show up when they sit between the root and a valid one
+    children = dict()
+    for path in cache_tree:
+        while path != "":
+            parent = os.path.dirname(path)
+            children.setdefault(parent, set()).add(path)
+            path = parent
+
+    out = bytearray()
+
+    def node(path):
+        kids = sorted(children.get(path, ()))
+        name = os.path.basename(path).encode("utf8")
+        if path in cache_tree:
+            count, sha = cache_tree[path]
+            out.extend(name + b"\x00" + f"{count} {len(kids)}\n".encode() + bytes.fromhex(sha))
+        else:
+            out.extend(name + b"\x00" + f"-1 {len(kids)}\n".encode())
+        for kid in kids:
+            node(kid)
+
+    if cache_tree:
+        node("")
+    return bytes(out)
+
+
+# Drops every directory on the way from the entry up to the root
+def cache_tree_invalidate(cache_tree, name):
+    path = name
+    while path != "":
+        path = os.path.dirname(path)
+        cache_tree.pop(path, None)
@@ -1,12 +1,101 @@
+import bisect
+import heapq
+from stage.cachetree import cache_tree_invalidate
+
+def index_entry_key(entry):
+    return entry.name
+
+# The staging area. Entries are kept sorted by path (the order git stores them in) and
+# found through a name -> position map, which is rebuilt lazily after entries move.
+# cache_tree holds the tree shas of untouched directories (see stage/cachetree.py); every
+# method that changes an entry invalidates the directories above it.
 class GITIndex(object):
     entries = []
     version = None
+    cache_tree = None
 
-    def __init__(self, version=2, entries=None):
+    def __init__(self, version=2, entries=None, cache_tree=None):
         if not entries:
             entries = list()
+        if cache_tree is None:
+            cache_tree = dict()
+        self.cache_tree = cache_tree
+        # a path can only be staged once; the last entry for it wins
+        unique = {e.name: e for e in entries}
+        if len(unique) != len(entries):
+            entries = list(unique.values())
         self.version = version
-        self.entries = entries
+        self.entries = sorted(entries, key=index_entry_key)
+        self._positions = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __contains__(self, name):
+        return self.position(name) is not None
+
+    # The map is built on the first lookup after entries moved, and answers in O(1) until the next move
+    def position(self, name):
+        if self._positions is None:
+            self._positions = {e.name: i for i, e in enumerate(self.entries)}
+        return self._positions.get(name)
+
+    def get(self, name):
+        i = self.position(name)
+        if i is None:
+            return None
+        return self.entries[i]
+
+    def changed(self, old, entry):
+        if old is None or old.sha != entry.sha or old.mode_type != entry.mode_type or old.mode_perms != entry.mode_perms:
+            cache_tree_invalidate(self.cache_tree, entry.name)
+
+    # Adds an entry, or replaces the one already staged for that path
+    def insert(self, entry):
+        i = self.position(entry.name)
+        if i is not None:
+            self.changed(self.entries[i], entry)
+            self.entries[i] = entry
+            return
+        self.changed(None, entry)
+        i = bisect.bisect_left(self.entries, entry.name, key=index_entry_key)
+        self.entries.insert(i, entry)
+        self._positions = None
+
+    def remove(self, name):
+        i = self.position(name)
+        if i is None:
+            return None
+        entry = self.entries.pop(i)
+        self._positions = None
+        cache_tree_invalidate(self.cache_tree, name)
+        return entry
+
+    # Bulk versions of insert/remove: one pass over the entries for any number of paths
+    def update(self, entries):
+        added = list()
+        for entry in entries:
+            i = self.position(entry.name)
+            if i is None:
+                self.changed(None, entry)
+                added.append(entry)
+            else:
+                self.changed(self.entries[i], entry)
+                self.entries[i] = entry
+        if added:
+            added.sort(key=index_entry_key)
+            self.entries = list(heapq.merge(self.entries, added, key=index_entry_key))
+            self._positions = None
+
+    def remove_many(self, names):
+        names = set(names)
+        self.entries = [e for e in self.entries if e.name not in names]
+        self._positions = None
+        for name in names:
+            cache_tree_invalidate(self.cache_tree, name)
 
 # Index file : header(DIRC + format version number + number of entries) and entries
 class GITIndexEntry(object):
@@ -28,3 +117,22 @@ class GITIndexEntry(object):
         self.flag_assume_valid = flag_assume_valid
         self.flag_stage = flag_stage
         self.name = name
+
+    # Entry for a regular file at name, given its blob sha and a fresh os.stat of it
+    @staticmethod
+    def from_stat(name, sha, stat):
+        return GITIndexEntry(ctime=(int(stat.st_ctime), stat.st_ctime_ns % 10**9),
+                             mtime=(int(stat.st_mtime), stat.st_mtime_ns % 10**9),
+                             dev=stat.st_dev, ino=stat.st_ino,
+                             mode_type=0b1000, mode_perms=0o644, uid=stat.st_uid, gid=stat.st_gid,
+                             fsize=stat.st_size, sha=sha, flag_assume_valid=False,
+                             flag_stage=False, name=name)
+
+    # Whether the file behind this entry still looks the same as when it was hashed.
+    # dev and ino are only stored on 32 bits in the index file.
+    def stat_matches(self, stat):
+        return (self.ctime[0] * 10**9 + self.ctime[1] == stat.st_ctime_ns
+                and self.mtime[0] * 10**9 + self.mtime[1] == stat.st_mtime_ns
+                and self.fsize == stat.st_size
+                and self.ino == stat.st_ino & 0xFFFFFFFF
+                and self.dev == stat.st_dev & 0xFFFFFFFF)
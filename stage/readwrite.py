@@ -1,48 +1,56 @@
 import os
+import hashlib
+import struct
 from helpers.repo.helpers import repo_file
 from stage.indexfile import GITIndex, GITIndexEntry
-from math import ceil
+from stage.cachetree import cache_tree_parse, cache_tree_serialize
+
+# Header: b"DIRC" + version + number of entries
+INDEX_HEADER = struct.Struct(">4sII")
+# Entry: ctime s/ns, mtime s/ns, dev, ino, mode, uid, gid, size (4 bytes each), sha, flags
+INDEX_ENTRY = struct.Struct(">10I20sH")
+# Every entry (fixed part + name + at least one NUL) is padded to a multiple of this
+INDEX_ENTRY_ALIGN = 8
+# Extensions (between the entries and the trailer): 4 byte signature + data size
+INDEX_EXTENSION = struct.Struct(">4sI")
+# Trailer: sha1 of everything before it
+INDEX_CHECKSUM_SIZE = 20
+
+U32 = 0xFFFFFFFF
 
 def index_write(repo, index):
-        with open(repo_file(repo, "index"), "wb") as f:
-            f.write(b"DIRC")
-            f.write(index.version.to_bytes(4, "big"))
-            f.write(len(index.entries).to_bytes(4, "big"))
-
-            idx = 0
-            for e in index.entries:
-                f.write(e.ctime[0].to_bytes(4, "big"))
-                f.write(e.ctime[1].to_bytes(4, "big"))
-                f.write(e.mtime[0].to_bytes(4, "big"))
-                f.write(e.mtime[1].to_bytes(4, "big"))
-                f.write(e.dev.to_bytes(4, "big"))
-                f.write(e.ino.to_bytes(4, "big"))
-
-                mode = (e.mode_type << 12) | e.mode_perms
-                f.write(mode.to_bytes(4, "big"))
-                f.write(e.uid.to_bytes(4, "big"))
-                f.write(e.gid.to_bytes(4, "big"))
-
-                f.write(e.fsize.to_bytes(4, "big"))
-                f.write(int(e.sha, 16).to_bytes(20, "big"))
-                flag_assume_valid = 0x1 << 15 if e.flag_assume_valid else 0
-                name_bytes = e.name.encode("utf8")
-                bytes_len = len(name_bytes)
-                if bytes_len >= 0xFFF:
-                    name_length = 0xFFF
-                else:
-                    name_length = bytes_len
-
-                f.write((flag_assume_valid | e.flag_stage | name_length).to_bytes(2, "big"))
-
-                f.write(name_bytes)
-                f.write((0).to_bytes(1, "big"))
-
-                idx += 62 + len(name_bytes) + 1
-                if idx % 8 != 0:
-                    pad = 8 - (idx % 8)
-                    f.write((0).to_bytes(pad, "big"))
-                    idx += pad
+    out = bytearray(INDEX_HEADER.pack(b"DIRC", index.version, len(index.entries)))
+
+    for e in index.entries:
+        mode = (e.mode_type << 12) | e.mode_perms
+        flag_assume_valid = 0x1 << 15 if e.flag_assume_valid else 0
+        name_bytes = e.name.encode("utf8")
+        name_length = min(len(name_bytes), 0xFFF)
+
+        out += INDEX_ENTRY.pack(e.ctime[0] & U32, e.ctime[1] & U32,
+                                e.mtime[0] & U32, e.mtime[1] & U32,
+                                e.dev & U32, e.ino & U32, mode,
+                                e.uid & U32, e.gid & U32, e.fsize & U32,
+                                bytes.fromhex(e.sha),
+                                flag_assume_valid | e.flag_stage | name_length)
+        out += name_bytes
+
+        # NUL terminator plus padding up to the next 8 byte boundary
+        length = INDEX_ENTRY.size + len(name_bytes)
+        out += b"\x00" * (INDEX_ENTRY_ALIGN - length % INDEX_ENTRY_ALIGN)
+
+    if index.cache_tree:
+        data = cache_tree_serialize(index.cache_tree)
+        out += INDEX_EXTENSION.pack(b"TREE", len(data)) + data
+
+    out += hashlib.sha1(out).digest()
+
+    # written next to the index and renamed over it, so a reader never sees half an index
+    index_file = repo_file(repo, "index")
+    tmp_file = index_file + ".lock"
+    with open(tmp_file, "wb") as f:
+        f.write(out)
+    os.replace(tmp_file, index_file)
 
 def index_read(repo):
     index_file = repo_file(repo, "index")
@@ -53,56 +61,41 @@ def index_read(repo):
     with open(index_file, 'rb') as f:
         raw = f.read()
 
-    header = raw[:12]
-    signature = header[:4]
+    signature, version, count = INDEX_HEADER.unpack_from(raw, 0)
     assert signature == b"DIRC" # -> "DirCache"
-    version = int.from_bytes(header[4:8], "big")
     assert version == 2, "wyag only supports index file version 2"
-    count = int.from_bytes(header[8:12], "big")
 
     entries = list()
-
-    content = raw[12:]
-    idx = 0
+    content = memoryview(raw)
+    idx = INDEX_HEADER.size
     for i in range(0, count):
-        ctime_s =  int.from_bytes(content[idx: idx+4], "big")
-        ctime_ns = int.from_bytes(content[idx+4: idx+8], "big")
-        mtime_s = int.from_bytes(content[idx+8: idx+12], "big")
-        mtime_ns = int.from_bytes(content[idx+12: idx+16], "big")
-        dev = int.from_bytes(content[idx+16: idx+20], "big")
-        ino = int.from_bytes(content[idx+20: idx+24], "big")
-        unused = int.from_bytes(content[idx+24: idx+26], "big")
-        assert 0 == unused
-        mode = int.from_bytes(content[idx+26: idx+28], "big")
+        (ctime_s, ctime_ns, mtime_s, mtime_ns, dev, ino, mode,
+         uid, gid, fsize, sha, flags) = INDEX_ENTRY.unpack_from(content, idx)
+
+        # the mode is really 16 unused bits followed by 16 bits of mode
+        assert mode >> 16 == 0
         mode_type = mode >> 12
         assert mode_type in [0b1000, 0b1010, 0b1110]
         mode_perms = mode & 0b0000000111111111
-        uid = int.from_bytes(content[idx+28: idx+32], "big")
-        gid = int.from_bytes(content[idx+32: idx+36], "big")
-        fsize = int.from_bytes(content[idx+36: idx+40], "big")
-        sha = format(int.from_bytes(content[idx+40: idx+60], "big"), "040x")
-        flags = int.from_bytes(content[idx+60: idx+62], "big")
         flag_assume_valid = (flags & 0b1000000000000000) != 0
         flag_extended = (flags & 0b0100000000000000) != 0
         assert not flag_extended
         flag_stage =  flags & 0b0011000000000000
         name_length = flags & 0b0000111111111111
 
-        idx += 62
+        start = idx + INDEX_ENTRY.size
 
         if name_length < 0xFFF:
-            assert content[idx + name_length] == 0x00
-            raw_name = content[idx:idx+name_length]
-            idx += name_length + 1
+            assert raw[start + name_length] == 0x00
+            end = start + name_length
         else:
             print(f"Notice: Name is 0x{name_length:X} bytes long.")
-            null_idx = content.find(b'\x00', idx + 0xFFF)
-            raw_name = content[idx: null_idx]
-            idx = null_idx + 1
+            end = raw.find(b'\x00', start + 0xFFF)
 
-        name = raw_name.decode("utf8")
+        name = str(content[start:end], "utf8")
 
-        idx = 8 * ceil(idx / 8)
+        length = end - idx
+        idx += length + INDEX_ENTRY_ALIGN - length % INDEX_ENTRY_ALIGN
 
         entries.append(GITIndexEntry(ctime=(ctime_s, ctime_ns),
                                      mtime=(mtime_s,  mtime_ns),
@@ -113,9 +106,29 @@ def index_read(repo):
                                      uid=uid,
                                      gid=gid,
                                      fsize=fsize,
-                                     sha=sha,
+                                     sha=sha.hex(),
                                      flag_assume_valid=flag_assume_valid,
                                      flag_stage=flag_stage,
                                      name=name))
 
-    return GITIndex(version=version, entries=entries)
+    cache_tree = dict()
+
+    # Index files written before the trailer existed simply end after the last entry
+    if idx < len(raw):
+        if len(raw) - idx < INDEX_CHECKSUM_SIZE:
+            raise Exception("Index file is truncated")
+        if hashlib.sha1(content[:-INDEX_CHECKSUM_SIZE]).digest() != raw[-INDEX_CHECKSUM_SIZE:]:
+            raise Exception("Index file is corrupt: checksum mismatch")
+
+        end = len(raw) - INDEX_CHECKSUM_SIZE
+        while idx < end:
+            signature, size = INDEX_EXTENSION.unpack_from(content, idx)
+            data = raw[idx + INDEX_EXTENSION.size : idx + INDEX_EXTENSION.size + size]
+            if signature == b"TREE":
+                cache_tree = cache_tree_parse(data)
+            elif not b"A" <= signature[0:1] <= b"Z":
+                # like git: extensions starting with a capital letter are optional, the rest are not
+                raise Exception(f"Unsupported index extension {signature}")
+            idx += INDEX_EXTENSION.size + size
+
+    return GITIndex(version=version, entries=entries, cache_tree=cache_tree)
@@ -0,0 +1,154 @@
+import os
+import struct
+import hashlib
+import subprocess
+import time
+from helpers.repo.helpers import repo_file
+
+# The untracked cache lives next to the index in .git/untracked-cache. For every directory
+# of the worktree it remembers the directory's mtime and what it contained, so a directory
+# whose mtime hasn't moved doesn't have to be listed again. Adding, removing or renaming
+# anything inside a directory bumps its mtime; editing a file doesn't, and doesn't need to.
+#
+# Layout: b"ZUNC" + version + scan time + directory count, then per directory
+#   {path}\x00 + mtime + file count + subdirectory count, then the names, each \x00 terminated
+# and a sha1 of everything before it.
+UNTRACKED_HEADER = struct.Struct(">4sIQI")
+UNTRACKED_DIR = struct.Struct(">QII")
+UNTRACKED_VERSION = 1
+
+
+# Returns (scan time, {dir: (mtime, files, subdirs)}); an empty cache when missing or unreadable
+def untracked_cache_read(repo):
+    path = repo_file(repo, "untracked-cache")
+    if not os.path.exists(path):
+        return 0, dict()
+
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    if len(raw) < UNTRACKED_HEADER.size + 20 or hashlib.sha1(raw[:-20]).digest() != raw[-20:]:
+        return 0, dict()
+    signature, version, scanned, count = UNTRACKED_HEADER.unpack_from(raw, 0)
+    if signature != b"ZUNC" or version != UNTRACKED_VERSION:
+        return 0, dict()
+
+    dirs = dict()
+    pos = UNTRACKED_HEADER.size
+    for _ in range(count):
+        nul = raw.index(b"\x00", pos)
+        name = raw[pos:nul].decode("utf8")
+        mtime, nfiles, nsubdirs = UNTRACKED_DIR.unpack_from(raw, nul + 1)
+        pos = nul + 1 + UNTRACKED_DIR.size
+        names = list()
+        for _ in range(nfiles + nsubdirs):
+            nul = raw.index(b"\x00", pos)
+            names.append(raw[pos:nul].decode("utf8"))
+            pos = nul + 1
+        dirs[name] = (mtime, names[:nfiles], names[nfiles:])
+
+    return scanned, dirs
+
+
+def untracked_cache_write(repo, scanned, dirs):
+    out = bytearray(UNTRACKED_HEADER.pack(b"ZUNC", UNTRACKED_VERSION, scanned, len(dirs)))
+    for name, (mtime, files, subdirs) in dirs.items():
+        out += name.encode("utf8") + b"\x00"
+        out += UNTRACKED_DIR.pack(mtime, len(files), len(subdirs))
+        for f in files + subdirs:
+            out += f.encode("utf8") + b"\x00"
+    out += hashlib.sha1(out).digest()
+
+    path = repo_file(repo, "untracked-cache")
+    with open(path + ".lock", "wb") as f:
+        f.write(out)
+    os.replace(path + ".lock", path)
+
+
+# Asks the core.fsmonitor hook (same protocol as git's version 1 hook: called with "1" and
+# a time in nanoseconds, prints the \x00 separated paths changed since then) which
+# directories need a fresh look. None means "don't know, check everything".
+def untracked_fsmonitor_dirty(repo, since):
+    hook = repo.conf.get("core", "fsmonitor", fallback=None)
+    if not hook or not since:
+        return None
+
+    try:
+        result = subprocess.run([hook, "1", str(since)], cwd=repo.worktree, capture_output=True)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+
+    dirty = set()
+    for path in result.stdout.decode("utf8").split("\x00"):
+        path = path.strip().rstrip("/")
+        if not path:
+            continue
+        if path == "/" or os.path.isabs(path):
+            return None
+        # the directory that holds it changed, and so did the path itself if it is a directory
+        dirty.add(os.path.dirname(path))
+        dirty.add(path)
+    return dirty
+
+
+def _list_dir(full_path, root):
+    files = list()
+    subdirs = list()
+    with os.scandir(full_path) as it:
+        for entry in it:
+            if root and entry.name == ".git":
+                continue
+            if entry.is_dir():
+                # like os.walk, symlinked directories are neither files nor descended into
+                if not entry.is_symlink():
+                    subdirs.append(entry.name)
+            else:
+                files.append(entry.name)
+    return sorted(files), sorted(subdirs)
+
+
+# Every file of the worktree (relative paths), reusing the listing of unchanged directories.
+# The walk goes one directory at a time, so its order depends on the layout (a directory's own
+# files before its subdirectories'); the result is sorted once at the end, and comes out the
+# same whether the listings came from the cache or from the disk.
+def worktree_files(repo):
+    scanned, cache = untracked_cache_read(repo)
+    dirty = untracked_fsmonitor_dirty(repo, scanned)
+    now = time.time_ns()
+
+    ret = list()
+    dirs = dict()
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        cached = cache.get(rel)
+
+        if cached and dirty is not None and rel not in dirty:
+            # the watcher says nothing moved in here, not even a stat is needed
+            dirs[rel] = cached
+        else:
+            try:
+                mtime = os.stat(os.path.join(repo.worktree, rel)).st_mtime_ns
+            except OSError:
+                continue
+            # a directory changed in the same tick the cache was written ("racy") is listed again
+            if cached and cached[0] == mtime and mtime < scanned:
+                dirs[rel] = cached
+            else:
+                try:
+                    files, subdirs = _list_dir(os.path.join(repo.worktree, rel), rel == "")
+                except OSError:
+                    continue
+                dirs[rel] = (mtime, files, subdirs)
+
+        _, files, subdirs = dirs[rel]
+        for f in files:
+            ret.append(os.path.join(rel, f))
+        for d in reversed(subdirs):
+            stack.append(os.path.join(rel, d))
+
+    if dirs != cache or dirty is not None:
+        untracked_cache_write(repo, now, dirs)
+    return sorted(ret)